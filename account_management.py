@@ -1,35 +1,86 @@
-from collections import deque
+from contextlib import contextmanager
+import math
+
+
+# invariant checks on construction. on by default (and in tests), switched off in the training and testing loops.
+check_invariants = True
+
+
+def set_invariant_checks(enabled):
+    global check_invariants
+    previous = check_invariants
+    check_invariants = enabled
+    return previous
+
+
+@contextmanager
+def invariant_checks(enabled):
+    previous = set_invariant_checks(enabled)
+    try:
+        yield
+    finally:
+        set_invariant_checks(previous)
 
 
 class AccountState:
-    def __init__(self, fixed=0.0, floating=0.0, market_price=0.0, units=0, long_positions=0, short_positions=None):
-        if short_positions is None:
-            short_positions = []
+    __slots__ = ('fixed', 'floating', 'market_price', 'units', 'long_positions', 'short_lots', 'n_short_positions')
 
-        if units >= 0 and abs(abs(units) * market_price - floating) > 1e-5:
-            raise ValueError()
-        if units > 0 and (long_positions == 0 or len(short_positions) > 0):
-            raise ValueError()
-        if units < 0 and (long_positions > 0 or len(short_positions) == 0):
-            raise ValueError()
-        if units == 0 and (long_positions != 0 or len(short_positions) != 0):
-            raise ValueError()
-        if long_positions != 0 and len(short_positions) != 0:
-            raise ValueError()
+    def __init__(self, fixed=0.0, floating=0.0, market_price=0.0, units=0, long_positions=0, short_positions=None,
+                 short_lots=None):
+        # short positions are held as (entry_price, count) lots in opening order
+        if short_lots is None:
+            short_lots = self._to_lots(short_positions) if short_positions else ()
 
         self.fixed = fixed
         self.floating = floating
         self.units = units
         self.long_positions = long_positions
-        self.short_positions = short_positions
+        self.short_lots = short_lots
+        self.n_short_positions = sum(count for _, count in short_lots) if short_lots else 0
         self.market_price = market_price
 
+        if check_invariants:
+            self._check_invariants()
+
+    @classmethod
+    def _new(cls, fixed, floating, market_price, units, long_positions, short_lots, n_short_positions):
+        # constructor for internal use, skips argument defaults and recounting the short lots
+        state = object.__new__(cls)
+        state.fixed = fixed
+        state.floating = floating
+        state.units = units
+        state.long_positions = long_positions
+        state.short_lots = short_lots
+        state.n_short_positions = n_short_positions
+        state.market_price = market_price
+
+        if check_invariants:
+            state._check_invariants()
+        return state
+
+    def _check_invariants(self):
+        units = self.units
+        if units >= 0 and abs(abs(units) * self.market_price - self.floating) > 1e-5:
+            raise ValueError()
+        if units > 0 and (self.long_positions == 0 or self.n_short_positions > 0):
+            raise ValueError()
+        if units < 0 and (self.long_positions > 0 or self.n_short_positions == 0):
+            raise ValueError()
+        if units == 0 and (self.long_positions != 0 or self.n_short_positions != 0):
+            raise ValueError()
+        if self.long_positions != 0 and self.n_short_positions != 0:
+            raise ValueError()
+
+    @property
+    def short_positions(self):
+        return [entry_price for entry_price, count in self.short_lots for _ in range(count)]
+
     def __eq__(self, other):
         if not isinstance(other, AccountState):
             return False
 
         return (self.fixed == other.fixed and self.floating == other.floating and self.units == other.units and
-                self.long_positions == other.long_positions and self.short_positions == other.short_positions and
+                self.long_positions == other.long_positions and self.short_lots == other.short_lots and
                 self.market_price == other.market_price)
 
     def total(self):
@@ -46,15 +97,16 @@ class AccountState:
         if self.long_positions > 0:
             floating = self.long_positions * market_price
         else:
-            for p in self.short_positions:
-                floating += p + (p - market_price)
-
-        new_state = AccountState(fixed=self.fixed,
-                                 floating=floating,
-                                 units=self.units,
-                                 long_positions=self.long_positions,
-                                 short_positions=self.short_positions.copy(),
-                                 market_price=market_price)
+            for entry_price, count in self.short_lots:
+                floating += count * (entry_price + (entry_price - market_price))
+
+        new_state = AccountState._new(fixed=self.fixed,
+                                      floating=floating,
+                                      units=self.units,
+                                      long_positions=self.long_positions,
+                                      short_lots=self.short_lots,
+                                      n_short_positions=self.n_short_positions,
+                                      market_price=market_price)
         return new_state
 
     def trade(self, units):
@@ -64,78 +116,125 @@ class AccountState:
             return self._sell(units=abs(units))
 
     def _buy(self, units):
+        units = int(units)
         fixed = self.fixed
         floating = self.floating
         long_positions = self.long_positions
-        short_positions = deque(self.short_positions)
-
-        # close all short positions first
-        while len(short_positions) > 0 and units > 0:
-            entry_price = short_positions.popleft()
-            trade_value = entry_price + (entry_price - self.market_price)
+        short_lots = list(self.short_lots)
+        n_short_positions = self.n_short_positions
+
+        # close short positions first, oldest lots first
+        n_closed_lots = 0
+        for entry_price, count in short_lots:
+            if units == 0:
+                break
+            n = min(count, units)
+            trade_value = n * (entry_price + (entry_price - self.market_price))
             fixed += trade_value
             floating -= trade_value
-            units -= 1
+            units -= n
+            n_short_positions -= n
+            if n == count:
+                n_closed_lots += 1
+            else:
+                short_lots[n_closed_lots] = (entry_price, count - n)
+        short_lots = tuple(short_lots[n_closed_lots:])
 
         # open long positions
-        while units > 0 and fixed >= self.market_price:
-            long_positions += 1
-            fixed -= self.market_price
-            floating += self.market_price
-            units -= 1
-
-        new_state = AccountState(fixed=fixed,
-                                 floating=floating,
-                                 units=long_positions - len(short_positions),
-                                 long_positions=long_positions,
-                                 short_positions=list(short_positions),
-                                 market_price=self.market_price)
+        n = self._n_affordable(fixed=fixed, units=units)
+        long_positions += n
+        fixed -= n * self.market_price
+        floating += n * self.market_price
+
+        new_state = AccountState._new(fixed=fixed,
+                                      floating=floating,
+                                      units=long_positions - n_short_positions,
+                                      long_positions=long_positions,
+                                      short_lots=short_lots,
+                                      n_short_positions=n_short_positions,
+                                      market_price=self.market_price)
         return new_state
 
     def _sell(self, units):
+        units = int(units)
         fixed = self.fixed
         floating = self.floating
         long_positions = self.long_positions
-        short_positions = deque(self.short_positions)
+        short_lots = self.short_lots
+        n_short_positions = self.n_short_positions
 
-        # close all long positions first
-        while long_positions > 0 and units > 0:
-            fixed += self.market_price
-            floating -= self.market_price
-            long_positions -= 1
-            units -= 1
+        # close long positions first
+        n = min(long_positions, units)
+        fixed += n * self.market_price
+        floating -= n * self.market_price
+        long_positions -= n
+        units -= n
 
         # open short positions
-        while units > 0 and fixed >= self.market_price:
-            short_positions.append(self.market_price)
-            fixed -= self.market_price
-            floating += self.market_price
-            units -= 1
-
-        new_state = AccountState(fixed=fixed,
-                                 floating=floating,
-                                 units=long_positions - len(short_positions),
-                                 long_positions=long_positions,
-                                 short_positions=list(short_positions),
-                                 market_price=self.market_price)
+        n = self._n_affordable(fixed=fixed, units=units)
+        if n > 0:
+            fixed -= n * self.market_price
+            floating += n * self.market_price
+            n_short_positions += n
+            if short_lots and short_lots[-1][0] == self.market_price:
+                short_lots = short_lots[:-1] + ((self.market_price, short_lots[-1][1] + n),)
+            else:
+                short_lots = short_lots + ((self.market_price, n),)
+
+        new_state = AccountState._new(fixed=fixed,
+                                      floating=floating,
+                                      units=long_positions - n_short_positions,
+                                      long_positions=long_positions,
+                                      short_lots=short_lots,
+                                      n_short_positions=n_short_positions,
+                                      market_price=self.market_price)
         return new_state
 
+    def _n_affordable(self, fixed, units):
+        # number of units (at most units) that can be paid for out of fixed at the market price
+        if units <= 0 or fixed < self.market_price:
+            return 0
+        if self.market_price <= 0:
+            return units
+        return min(units, int(fixed // self.market_price))
+
     def get_units_to_trade(self, target_alloc):
-        if len(self.short_positions) > 0:
+        if self.n_short_positions > 0:
             if target_alloc <= self.alloc():
                 return -round((abs(target_alloc) * self.total() - self.floating) / self.market_price)
             elif target_alloc >= 0:
                 return round(self.total() * target_alloc / self.market_price) + abs(self.units)
             else:
-                units = 0
-                state = self
-                while state.alloc() < target_alloc:
-                    state = state._buy(1)
-                    units += 1
-                return units
+                return self._get_units_to_close_shorts(target_alloc=target_alloc)
         else:
             return round(self.total() * target_alloc / self.market_price) - self.units
 
+    def _get_units_to_close_shorts(self, target_alloc):
+        # smallest number of shorts to close (oldest first) for alloc() to reach target_alloc. closing n shorts of a
+        # lot moves n * trade_value from floating to fixed, so alloc() = -(floating - closed_value) / total.
+        threshold = self.floating + target_alloc * self.total()
+        units = 0
+        closed_value = 0.0
+        for entry_price, count in self.short_lots:
+            trade_value = entry_price + (entry_price - self.market_price)
+            if trade_value > 0:
+                n = max(0, math.ceil((threshold - closed_value) / trade_value))
+                if n <= count:
+                    return units + n
+            closed_value += count * trade_value
+            units += count
+        return units
+
+    @staticmethod
+    def _to_lots(short_positions):
+        lots = []
+        for entry_price in short_positions:
+            if lots and lots[-1][0] == entry_price:
+                lots[-1] = (entry_price, lots[-1][1] + 1)
+            else:
+                lots.append((entry_price, 1))
+        return tuple(lots)
+
     @staticmethod
     def perc_value_change(state1, state2):
         return (state2.total() - state1.total()) / state1.total() if state1.total() != 0 else 0
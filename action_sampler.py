@@ -0,0 +1,49 @@
+import math
+import numpy as np
+
+
+class ActionSampler:
+    """
+    Draws the actions of a batch of categorical policies in one call by inverse CDF sampling: one uniform number per
+    row of prob, located in the row's cumulative sum. Randomness comes from a numpy Generator (rng, or one seeded
+    with seed), so sampling is reproducible and independent of torch's global state.
+    """
+    def __init__(self, seed=None, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+
+    def sample(self, prob, greedy=False):
+        """
+        prob holds action probabilities along its last axis, for one policy (n_actions,) or a batch (n, n_actions).
+        Returns (actions, log_probs) of shape prob.shape[:-1]. With greedy, the most probable actions are taken
+        instead. Raises ValueError if a policy is not finite (e.g. NaN states or weights).
+        """
+        prob = np.asarray(prob)
+        n_actions = prob.shape[-1]
+        cdf = prob.cumsum(axis=-1)
+        total = cdf[..., -1]
+        # a NaN or inf anywhere in a row ends up in its total
+        if not np.isfinite(total).all():
+            rows = np.flatnonzero(~np.isfinite(np.atleast_1d(total)))
+            raise ValueError(f'policy probabilities are not finite in rows {rows.tolist()}: '
+                             f'{np.atleast_2d(prob)[rows[:5]]}')
+
+        if prob.ndim == 1:
+            # single policy: scalar operations avoid the per call overhead of the batched ones
+            if greedy:
+                action = int(prob.argmax())
+            else:
+                action = min(int(cdf.searchsorted(self.rng.random() * total, side='right')), n_actions - 1)
+            p = float(prob[action])
+            return action, math.log(p) if p > 0 else -math.inf
+
+        if greedy:
+            actions = prob.argmax(axis=-1)
+        else:
+            # first action whose cdf exceeds u * total, which skips zero probability actions
+            threshold = self.rng.random(size=total.shape) * total
+            actions = np.minimum((cdf <= threshold[..., None]).sum(axis=-1), n_actions - 1)
+
+        rows = prob.reshape(-1, n_actions)
+        p = rows[np.arange(len(rows)), actions.ravel()].reshape(actions.shape)
+        log_probs = np.log(p, out=np.full(p.shape, -np.inf, dtype=p.dtype), where=p > 0)
+        return actions, log_probs
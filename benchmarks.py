@@ -0,0 +1,244 @@
+import argparse
+import contextlib
+import io
+import json
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import torch
+
+from account_management import AccountState, invariant_checks
+from data_management import load_dfs, filter_dfs
+from features import attach_features, feature_specs
+from ppo import PPO
+from price_store import price_store_file_name
+from rl_env import TradingEnv
+
+
+base_data_path = Path(__file__).parent.joinpath('data')
+bench_tickers = ['AAPL', 'MMM', 'XOM']
+state_features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+bench_allocations = [-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]
+# a benchmark regresses when its time per call exceeds the baseline's by more than this fraction
+default_threshold = 0.25
+
+
+def _time_per_call(f, number, repeat=5):
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number
+
+
+def _bytes_per_object(f, number):
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    objects = [f() for _ in range(number)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # discount the list holding the objects
+    return (end - start - 8 * len(objects)) / number
+
+
+def _load_csv(ticker):
+    df = pd.read_csv(base_data_path.joinpath(f'{ticker}.csv'), header=0, index_col='Date')
+    df.index = pd.to_datetime(df.index)
+    return df.dropna()
+
+
+def bench_account_state(number=20000):
+    long_state = AccountState(fixed=1000.0, market_price=10.0).trade(units=50)
+    short_state = AccountState(fixed=1000.0, market_price=10.0).trade(units=-50).update(market_price=9.0)
+
+    cases = {
+        'ctor': lambda: AccountState(fixed=500.0, floating=500.0, units=50, long_positions=50, market_price=10.0),
+        'update': lambda: long_state.update(market_price=11.0),
+        'trade': lambda: short_state.trade(units=70),
+    }
+
+    results = {}
+    for name, f in cases.items():
+        for checks in (True, False):
+            with invariant_checks(checks):
+                key = f'account_state.{name}[checks={"on" if checks else "off"}]'
+                results[key] = {'us_per_call': _time_per_call(f, number=number) * 1e6,
+                                'bytes_per_object': _bytes_per_object(f, number=number)}
+    return results
+
+
+def bench_trading(number=20000):
+    # unit counts of the training loop: a 10000 balance at a price of 50, allocations up to +-0.6
+    with invariant_checks(False):
+        flat_state = AccountState(fixed=10000.0, market_price=50.0)
+        long_state = flat_state.trade(units=120).update(market_price=52.0)
+        short_state = flat_state.trade(units=-40).update(market_price=48.0).trade(units=-40).update(market_price=51.0)
+
+        cases = {
+            'trade[open_long]': lambda: flat_state.trade(units=120),
+            'trade[close_long]': lambda: long_state.trade(units=-120),
+            'trade[open_short]': lambda: flat_state.trade(units=-120),
+            'trade[close_shorts]': lambda: short_state.trade(units=70),
+            'get_units_to_trade[long]': lambda: long_state.get_units_to_trade(target_alloc=-0.3),
+            'get_units_to_trade[short]': lambda: short_state.get_units_to_trade(target_alloc=-0.1),
+        }
+        return {f'account_state.{name}': {'us_per_call': _time_per_call(f, number=number) * 1e6}
+                for name, f in cases.items()}
+
+
+def bench_features(number=3):
+    # all features of a ticker's full history, as computed once per ticker by the FeatureStore
+    dfs = {ticker: _load_csv(ticker) for ticker in bench_tickers}
+    seconds = _time_per_call(lambda: [attach_features(df.copy(), features=list(feature_specs))
+                                      for df in dfs.values()], number=number, repeat=3)
+    n_rows = sum(len(df) for df in dfs.values())
+    return {'features.attach_features[per_ticker]': {'us_per_call': seconds / len(dfs) * 1e6,
+                                                     'rows_per_second': n_rows / seconds}}
+
+
+def bench_env_step(number=2000):
+    env = TradingEnv(dfs={ticker: _load_csv(ticker) for ticker in bench_tickers},
+                     starting_acc_balance=10000.0,
+                     features=state_features,
+                     allocations=bench_allocations,
+                     n_start_point_to_ignore=100,
+                     rng=np.random.default_rng(0))
+    actions = np.random.default_rng(0).integers(len(bench_allocations), size=number).tolist()
+    env.reset()
+
+    def run():
+        for action in actions:
+            _, _, done = env.step(action)
+            if done:
+                env.reset()
+
+    with invariant_checks(False):
+        seconds = _time_per_call(run, number=1)
+    return {'rl_env.step': {'us_per_call': seconds / number * 1e6, 'steps_per_second': number / seconds}}
+
+
+def bench_learner(number=20, horizon=100):
+    # one PPO update as in runs.train: a horizon of transitions, make_batch and the K_epoch steps of train_net
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    dim_state = len(state_features)
+    model = PPO(dim_state=dim_state, dim_actions=len(bench_allocations))
+    transitions = [(rng.normal(size=dim_state).astype(np.float32), int(rng.integers(len(bench_allocations))),
+                    float(rng.normal(scale=0.01)), rng.normal(size=dim_state).astype(np.float32),
+                    1 / len(bench_allocations), t == horizon - 1)
+                   for t in range(horizon)]
+
+    def fill():
+        for transition in transitions:
+            model.put_data(transition)
+
+    def update():
+        fill()
+        model.train_net()
+
+    make_batch_seconds = _time_per_call(lambda: (fill(), model.make_batch()), number=number)
+    update_seconds = _time_per_call(update, number=number)
+    return {'ppo.put_data+make_batch': {'us_per_call': make_batch_seconds * 1e6},
+            'ppo.update': {'us_per_call': update_seconds * 1e6}}
+
+
+def bench_data(number=1):
+    # load_dfs and filter_dfs with the parameters of main.py over all shipped tickers
+    source = 'store' if base_data_path.joinpath(price_store_file_name).is_file() else 'csv'
+    tickers = [path.stem for path in base_data_path.glob('*.csv')]
+
+    def run():
+        dfs = load_dfs(base_data_path=base_data_path, accepted_tickers=tickers)
+        return filter_dfs(dfs=dfs,
+                          min_ts_len=3000,
+                          max_days_break=pd.Timedelta(days=7),
+                          max_first_date=pd.Timestamp('1998-01-01'),
+                          min_first_date=pd.Timestamp('1993-01-01'),
+                          min_last_date=pd.Timestamp('2019-10-31'),
+                          n_rows_to_remove_start=300)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = _time_per_call(run, number=number, repeat=3)
+    # one name for both sources, so a baseline is always compared, the source is recorded with the result
+    return {'data.load_filter': {'us_per_call': seconds * 1e6, 'n_tickers': len(tickers), 'source': source}}
+
+
+benchmarks = {
+    'account_state': bench_account_state,
+    'trading': bench_trading,
+    'features': bench_features,
+    'env_step': bench_env_step,
+    'learner': bench_learner,
+    'data': bench_data,
+}
+
+
+def run_benchmarks(names=None):
+    results = {}
+    for name, bench in benchmarks.items():
+        if names is None or name in names:
+            results.update(bench())
+    return results
+
+
+def compare(results, baseline, threshold=default_threshold):
+    """
+    Returns {name: (baseline us, current us, ratio)} of the benchmarks in both results and baseline, the names of
+    those slower than baseline by more than threshold (e.g. 0.25 for 25%) and the names of the baseline benchmarks
+    missing from results.
+    """
+    comparison = {}
+    regressions = []
+    missing = [name for name in baseline if name not in results]
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['us_per_call']
+        after = result['us_per_call']
+        ratio = after / before
+        comparison[name] = (before, after, ratio)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return comparison, regressions, missing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='micro benchmarks for hot paths')
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), help='benchmark groups to run (default all)')
+    parser.add_argument('--save', type=Path, help='write the results as a JSON baseline')
+    parser.add_argument('--compare', type=Path, help='JSON baseline to compare with, exits with 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help='allowed slowdown against the baseline, as a fraction')
+    parser.add_argument('--allow-missing', action='store_true',
+                        help='do not fail on baseline benchmarks missing from a run of all groups')
+    args = parser.parse_args()
+
+    results = run_benchmarks(names=args.only)
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is None:
+        for name, result in results.items():
+            extra = ' '.join(f'{key}={value:.1f}' if isinstance(value, (int, float)) else f'{key}={value}'
+                             for key, value in result.items() if key != 'us_per_call')
+            print(f'{name:<45} {result["us_per_call"]:12.3f} us {extra}')
+    else:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparison, regressions, missing = compare(results=results, baseline=baseline, threshold=args.threshold)
+        for name, (before, after, ratio) in comparison.items():
+            flag = 'REGRESSION' if name in regressions else ''
+            print(f'{name:<45} {before:12.3f} us -> {after:12.3f} us {ratio:6.2f}x {flag}')
+        # with --only, the benchmarks of the other groups are expected to be missing
+        missing = missing if args.only is None else []
+        for name in missing:
+            print(f'{name:<45} MISSING')
+        failed = False
+        if regressions:
+            print(f'\n{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}.')
+            failed = True
+        if missing and not args.allow_missing:
+            print(f'\n{len(missing)} baseline benchmarks did not run.')
+            failed = True
+        if failed:
+            sys.exit(1)
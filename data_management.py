@@ -1,7 +1,11 @@
+from collections import namedtuple
+from collections.abc import Mapping
 import yfinance as yf
 import pandas as pd
 import numpy as np
 
+from price_store import PriceStore, LazyPriceDfs, build_price_store, price_store_file_name, price_columns
+
 
 def download_dfs(tickers):
     print('\n######## downloading data ########\n')
@@ -30,9 +34,21 @@ def save_dfs(dfs, base_data_path):
         path = base_data_path.joinpath(f'{ticker}.csv')
         dfs[ticker].to_csv(path)
 
+    # a price store built from the previous CSV files would otherwise keep serving their prices
+    store_path = base_data_path.joinpath(price_store_file_name)
+    if store_path.is_file():
+        build_price_store(base_data_path=base_data_path, store_path=store_path)
+
 
 def load_dfs(base_data_path, accepted_tickers):
     print('\n######## loading data ########\n')
+    store_path = base_data_path.joinpath(price_store_file_name)
+    if store_path.is_file() and not _csvs_newer_than(base_data_path=base_data_path, path=store_path):
+        # dataframes are built lazily from the memory mapped store, see price_store.build_price_store
+        store = PriceStore(store_path)
+        accepted_tickers = set(accepted_tickers)
+        return LazyPriceDfs(store=store, tickers=[ticker for ticker in store.tickers if ticker in accepted_tickers])
+
     dfs = {}
     for f in base_data_path.iterdir():
         if f.is_file() and f.stem in accepted_tickers:
@@ -43,118 +59,204 @@ def load_dfs(base_data_path, accepted_tickers):
     return dfs
 
 
-def train_test_split(dfs, split_date):
-    train_dfs = {}
-    test_dfs = {}
-    for ticker in dfs.keys():
-        train_dfs[ticker] = dfs[ticker][:split_date].copy()
-        test_dfs[ticker] = dfs[ticker][split_date:].copy()
+def _csvs_newer_than(base_data_path, path):
+    # CSV files modified after path was written, e.g. a store not rebuilt after the CSV files were updated
+    mtime = path.stat().st_mtime
+    stale = any(f.stat().st_mtime > mtime for f in base_data_path.glob('*.csv'))
+    if stale:
+        print(f'{path} is older than the CSV files, loading the CSV files instead.')
+    return stale
 
-    n_train_points = sum([len(df) for df in train_dfs.values()])
-    n_test_points = sum([len(df) for df in test_dfs.values()])
-    print(f'n_train_points={n_train_points}, n_test_points={n_test_points}')
-    return train_dfs, test_dfs
 
+Fold = namedtuple('Fold', ['train_start', 'test_start', 'test_end'])
 
-def filter_dfs(dfs, min_ts_len, max_days_break, max_first_date, min_first_date, min_last_date, n_rows_to_remove_start):
-    print('\n######## start filtering dfs ########\n')
-    init_n_keys = len(dfs)
-    init_n_points = sum([len(df) for df in dfs.values()])
-    tickers_to_del = []
-    for ticker in dfs.keys():
-        dfs[ticker] = dfs[ticker].iloc[n_rows_to_remove_start:]
-        dfs[ticker] = dfs[ticker].loc[min_first_date:]
 
-        dfs[ticker] = dfs[ticker].replace(['NaN', 'NaT'], np.nan)
-        dfs[ticker] = dfs[ticker].dropna(axis=0)
+class DfsView(Mapping):
+    """
+    dict-like ticker -> rows start:stop of dfs[ticker]. The rows are sliced on access, so the DataFrames share
+    their data with dfs instead of copying it.
+    """
+    def __init__(self, dfs, ranges):
+        self.dfs = dfs
+        self.ranges = ranges
 
-        if len(dfs[ticker]) < min_ts_len:
-            print(f'-- discarding {ticker}: n_points ({len(dfs[ticker])}) < min ({min_ts_len})).')
-            tickers_to_del.append(ticker)
-            continue
-
-        if not _date_range_ok(df=dfs[ticker], ticker=ticker, max_first_date=max_first_date, min_last_date=min_last_date):
-            tickers_to_del.append(ticker)
-            continue
+    def __getitem__(self, ticker):
+        start, stop = self.ranges[ticker]
+        return self.dfs[ticker].iloc[start:stop]
 
-        if not _data_continuity_ok(df=dfs[ticker], ticker=ticker, max_days_break=max_days_break):
-            tickers_to_del.append(ticker)
-            continue
+    def __iter__(self):
+        return iter(self.ranges)
 
-        if not _price_range_ok(df=dfs[ticker], ticker=ticker):
-            tickers_to_del.append(ticker)
-            continue
-
-        if not _volume_range_ok(df=dfs[ticker], ticker=ticker):
-            tickers_to_del.append(ticker)
-            continue
+    def __len__(self):
+        return len(self.ranges)
 
-    for ticker in tickers_to_del:
-        del(dfs[ticker])
+    def n_points(self):
+        return sum(stop - start for start, stop in self.ranges.values())
 
-    total_len = sum([len(df) for df in dfs.values()])
-    print(f'\ninitially: {init_n_keys} dfs ({init_n_points} data points).')
-    print(f'remaining: {init_n_keys} - {len(tickers_to_del)} = {len(dfs)} dfs ({total_len} data points).')
 
-    # sanity check
-    for ticker, df in dfs.items():
-        if not _date_range_ok(df=df, ticker=ticker, max_first_date=max_first_date, min_last_date=min_last_date):
-            raise ValueError
-
-        if not _data_continuity_ok(df=df, ticker=ticker, max_days_break=max_days_break):
-            raise ValueError
-
-        if not _price_range_ok(df=df, ticker=ticker):
-            raise ValueError
-
-        if not _volume_range_ok(df=df, ticker=ticker):
-            raise ValueError
-
-    return dfs
-
-
-def _date_range_ok(df, ticker, max_first_date, min_last_date):
-    dates = pd.DataFrame(df.index)
-    first_date = dates.min()[0]
-    last_date = dates.max()[0]
-
-    if first_date > max_first_date or last_date < min_last_date:
-        print(f'-- discarding {ticker}: range=({first_date.date()}) to ({last_date.date()}).')
-        return False
-    return True
-
-
-def _data_continuity_ok(df, ticker, max_days_break):
-    dates = pd.DataFrame(df.index)
-    max_diff = dates.diff().max()[0]
-    if max_diff > max_days_break:
-        print(f'discarded {ticker}: max_diff ({max_diff}) > allowed ({max_days_break}).')
-        return False
-    return True
+def get_row_ranges(dfs, start_date=None, end_date=None):
+    # ticker -> (start, stop) of the rows with start_date <= date < end_date
+    ranges = {}
+    for ticker in dfs.keys():
+        index = dfs[ticker].index
+        start = index.searchsorted(start_date, side='left') if start_date is not None else 0
+        stop = index.searchsorted(end_date, side='left') if end_date is not None else len(index)
+        ranges[ticker] = (int(start), int(max(start, stop)))
+    return ranges
 
 
-def _price_range_ok(df, ticker):
-    if (df[['Open', 'High', 'Low', 'Close']] < 0.001).any().any():
-        print(f'discarded {ticker}: contains prices below min acceptable.')
-        return False
+def train_test_split(dfs, split_date):
+    # both halves include split_date itself, as the label slices dfs[ticker][:split_date] and [split_date:] did
+    train_dfs = DfsView(dfs=dfs, ranges=get_row_ranges(dfs=dfs, end_date=split_date + pd.Timedelta(1, unit='ns')))
+    test_dfs = DfsView(dfs=dfs, ranges=get_row_ranges(dfs=dfs, start_date=split_date))
 
-    if (df[['Open', 'High', 'Low', 'Close']] > 3000.0).any().any():
-        print(f'discarded {ticker}: contains prices above max acceptable.')
-        return False
+    print(f'n_train_points={train_dfs.n_points()}, n_test_points={test_dfs.n_points()}')
+    return train_dfs, test_dfs
 
-    return True
 
+def walk_forward_folds(first_test_date, last_test_date, test_period, train_period=None):
+    """
+    Returns consecutive Folds whose test windows [test_start, test_end) of length test_period cover first_test_date
+    to last_test_date. Each fold trains on [train_start, test_start), which is the preceding train_period or, if
+    train_period is None, all data before test_start (train_start is then None).
+    """
+    folds = []
+    test_start = pd.Timestamp(first_test_date)
+    while test_start < pd.Timestamp(last_test_date):
+        train_start = test_start - train_period if train_period is not None else None
+        folds.append(Fold(train_start=train_start, test_start=test_start, test_end=test_start + test_period))
+        test_start = test_start + test_period
+    return folds
 
-def _volume_range_ok(df, ticker):
-    if (df['Volume'] < 1000).any().any():
-        print(f'discarded {ticker}: contains volume below min acceptable.')
-        return False
 
-    if (df['Volume'] > 1e10).any().any():
-        print(f'discarded {ticker}: contains volume above max acceptable.')
-        return False
+def fold_split(dfs, fold, min_ts_len=1):
+    """
+    Returns the train and test DfsView of a Fold. Tickers with fewer than min_ts_len rows in a window are left out
+    of that window.
+    """
+    views = []
+    for start_date, end_date in [(fold.train_start, fold.test_start), (fold.test_start, fold.test_end)]:
+        ranges = get_row_ranges(dfs=dfs, start_date=start_date, end_date=end_date)
+        views.append(DfsView(dfs=dfs, ranges={ticker: (start, stop) for ticker, (start, stop) in ranges.items()
+                                              if stop - start >= min_ts_len}))
+    return views[0], views[1]
 
-    return True
 
+filter_reasons = ['n_points', 'date_range', 'continuity', 'price_min', 'price_max', 'volume_min', 'volume_max']
 
 
+def filter_dfs(dfs, min_ts_len, max_days_break, max_first_date, min_first_date, min_last_date, n_rows_to_remove_start):
+    """
+    Drops the first n_rows_to_remove_start rows of every df, the rows before min_first_date and rows with missing
+    prices, then discards tickers failing any check. All tickers are checked in one vectorized pass over their stacked
+    rows. Returns the remaining dfs and a report with one row per ticker, where reason is the first failed check of
+    filter_reasons (None if the ticker is kept).
+    """
+    tickers = list(dfs.keys())
+    n_tickers = len(tickers)
+    dates, columns, lengths = _stack_panel(dfs=dfs, tickers=tickers)
+    starts = np.cumsum(lengths) - lengths
+    codes = np.repeat(np.arange(n_tickers), lengths)
+
+    keep_rows = (np.arange(len(dates)) - np.repeat(starts, lengths) >= n_rows_to_remove_start) \
+        & (dates >= _to_ns(min_first_date)) & ~np.isnan(columns).any(axis=0)
+    kept_codes = codes[keep_rows]
+    kept_dates = dates[keep_rows]
+    kept_prices = np.minimum.reduce(columns[:4], axis=0)[keep_rows], np.maximum.reduce(columns[:4], axis=0)[keep_rows]
+    kept_volumes = columns[4][keep_rows]
+
+    # kept rows stay grouped by ticker, so every ticker is one contiguous segment of the kept rows
+    n_points = np.bincount(kept_codes, minlength=n_tickers)
+    seg_starts = np.cumsum(n_points) - n_points
+    has_points = n_points > 0
+
+    day_diffs = np.zeros(len(kept_dates), dtype=np.int64)
+    day_diffs[1:] = np.diff(kept_dates)
+    day_diffs[seg_starts[has_points]] = 0
+
+    nat = np.datetime64('NaT', 'ns').view(np.int64)
+    first_date = np.full(n_tickers, nat)
+    first_date[has_points] = kept_dates[seg_starts[has_points]]
+    last_date = np.full(n_tickers, nat)
+    last_date[has_points] = kept_dates[seg_starts[has_points] + n_points[has_points] - 1]
+    max_diff = _segment_reduce(np.maximum, day_diffs, seg_starts, has_points, empty=0)
+    min_price = _segment_reduce(np.minimum, kept_prices[0], seg_starts, has_points, empty=np.nan)
+    max_price = _segment_reduce(np.maximum, kept_prices[1], seg_starts, has_points, empty=np.nan)
+    min_volume = _segment_reduce(np.minimum, kept_volumes, seg_starts, has_points, empty=np.nan)
+    max_volume = _segment_reduce(np.maximum, kept_volumes, seg_starts, has_points, empty=np.nan)
+
+    # one column per check, in the order of filter_reasons
+    failed = np.stack([n_points < min_ts_len,
+                       (first_date > _to_ns(max_first_date)) | (last_date < _to_ns(min_last_date)),
+                       max_diff > pd.Timedelta(max_days_break).value,
+                       min_price < 0.001,
+                       max_price > 3000.0,
+                       min_volume < 1000,
+                       max_volume > 1e10], axis=1)
+    kept = ~failed.any(axis=1)
+    reason = np.where(kept, None, np.array(filter_reasons, dtype=object)[failed.argmax(axis=1)])
+
+    report = pd.DataFrame({'n_points': n_points,
+                           'first_date': first_date.view('datetime64[ns]'),
+                           'last_date': last_date.view('datetime64[ns]'),
+                           'max_days_break': max_diff.view('timedelta64[ns]'),
+                           'min_price': min_price,
+                           'max_price': max_price,
+                           'min_volume': min_volume,
+                           'max_volume': max_volume,
+                           'reason': reason},
+                          index=pd.Index(tickers, name='ticker'))
+
+    filtered_dfs = {}
+    for i in np.flatnonzero(kept):
+        filtered_dfs[tickers[i]] = _filter_rows(dfs=dfs, ticker=tickers[i],
+                                                rows=keep_rows[starts[i]:starts[i] + lengths[i]])
+    return filtered_dfs, report
+
+
+def _stack_panel(dfs, tickers):
+    # int64 ns dates and float64 Open, High, Low, Close, Volume rows of all tickers, stacked in ticker order
+    from_store = [isinstance(dfs, LazyPriceDfs) and ticker not in dfs.dfs for ticker in tickers]
+    lengths = np.array([dfs.store.index[ticker][1] if in_store else len(dfs[ticker])
+                        for ticker, in_store in zip(tickers, from_store)], dtype=np.int64)
+    dates = np.empty(lengths.sum(), dtype=np.int64)
+    columns = np.empty((len(price_columns), lengths.sum()), dtype=np.float64)
+
+    offset = 0
+    for ticker, in_store, length in zip(tickers, from_store, lengths):
+        rows = slice(offset, offset + length)
+        if in_store:
+            # read straight from the store, without building the DataFrame
+            arrays = dfs.store.get_arrays(ticker)
+            np.multiply(arrays['Date'], 86400 * 10 ** 9, out=dates[rows])
+            for j, column in enumerate(price_columns):
+                columns[j, rows] = arrays[column]
+        else:
+            df = dfs[ticker]
+            if list(df.columns) != price_columns:
+                df = df[price_columns]
+            if (df.dtypes == object).any():
+                # columns holding 'NaN' or 'NaT' strings
+                df = df.apply(pd.to_numeric, errors='coerce')
+            dates[rows] = df.index.values.astype('datetime64[ns]').view(np.int64)
+            columns[:, rows] = df.values.T
+        offset += length
+
+    return dates, columns, lengths
+
+
+def _filter_rows(dfs, ticker, rows):
+    if isinstance(dfs, LazyPriceDfs) and ticker not in dfs.dfs:
+        return dfs.store.get_df(ticker, rows=rows)
+    return dfs[ticker][rows]
+
+
+def _segment_reduce(ufunc, values, seg_starts, has_points, empty):
+    result = np.full(len(seg_starts), empty, dtype=values.dtype)
+    if has_points.any():
+        result[has_points] = ufunc.reduceat(values, seg_starts[has_points])
+    return result
+
+
+def _to_ns(timestamp):
+    return pd.Timestamp(timestamp).value
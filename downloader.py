@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from price_store import build_price_store, price_store_file_name, price_columns
+
+
+checkpoint_file_name = 'download_checkpoint.json'
+# stored and refetched closes of the last stored bar further apart than this mean the history was adjusted since
+# (split or dividend), the atol covers prices stored with 2 decimals
+close_rtol = 1e-4
+close_atol = 0.005
+
+
+class YahooSource:
+    """
+    Daily bars from Yahoo Finance, adjusted like download_dfs (auto_adjust=True). Adjusted prices change when a
+    split or dividend occurs, which update_data detects on the last stored bar.
+    """
+    def fetch(self, ticker, start=None):
+        import yfinance as yf
+        tk = yf.Ticker(ticker=ticker)
+        if start is None:
+            df = tk.history(period='max', interval='1d', auto_adjust=True)
+        else:
+            df = tk.history(start=start, interval='1d', auto_adjust=True)
+        return _normalize(df)
+
+
+class DirectorySource:
+    """
+    Daily bars read from per ticker CSV files in a directory, a local stand-in for YahooSource.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def fetch(self, ticker, start=None):
+        path = self.path.joinpath(f'{ticker}.csv')
+        if not path.is_file():
+            return pd.DataFrame(columns=price_columns)
+        df = pd.read_csv(path, header=0, index_col='Date')
+        df.index = pd.to_datetime(df.index)
+        df = _normalize(df)
+        return df.loc[start:] if start is not None else df
+
+
+def update_data(tickers, base_data_path, source=None, n_threads=8):
+    """
+    Brings the CSV files in base_data_path up to date: for every ticker, the bars from the last stored date on are
+    fetched from source (by default Yahoo Finance, n_threads tickers at a time) and the new ones appended to its
+    file. If the refetched close of the last stored bar differs from the stored one, prices were adjusted since and
+    the ticker's full history is fetched and rewritten instead. Completed tickers are recorded in a checkpoint file,
+    so an interrupted update resumes with the remaining tickers on the same day; a checkpoint of an earlier day is
+    ignored. An existing price store is rebuilt afterwards. Returns a dict ticker -> number of new bars (None if
+    the ticker failed).
+    """
+    print('\n######## updating data ########\n')
+    base_data_path = Path(base_data_path)
+    source = source if source is not None else YahooSource()
+    checkpoint = _Checkpoint(base_data_path.joinpath(checkpoint_file_name),
+                             run_date=pd.Timestamp.today().strftime('%Y-%m-%d'))
+
+    tickers = list(tickers)
+    pending = [ticker for ticker in tickers if ticker not in checkpoint.completed]
+    if len(pending) < len(tickers):
+        print(f'resuming: {len(tickers) - len(pending)} tickers already updated.')
+
+    n_new = {ticker: checkpoint.completed[ticker] for ticker in tickers if ticker in checkpoint.completed}
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        futures = {pool.submit(_update_ticker, source, ticker, base_data_path): ticker for ticker in pending}
+        for counter, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            try:
+                n_new[ticker] = future.result()
+            except Exception as e:
+                n_new[ticker] = None
+                print(f'({counter}/{len(pending)}) failed: {ticker} ({e!r}).')
+                continue
+            checkpoint.complete(ticker=ticker, n_new=n_new[ticker])
+            print(f'({counter}/{len(pending)}) updated: {ticker}, ({n_new[ticker]} new points).')
+
+    n_failed = sum(n is None for n in n_new.values())
+    if n_failed == 0:
+        checkpoint.remove()
+
+    store_path = base_data_path.joinpath(price_store_file_name)
+    if store_path.is_file() and any(n_new.values()):
+        build_price_store(base_data_path=base_data_path, store_path=store_path)
+
+    print(f'\nupdated {len(tickers) - n_failed} tickers with total {sum(n or 0 for n in n_new.values())} new data '
+          f'points, {n_failed} failed.\n')
+    return {ticker: n_new[ticker] for ticker in tickers}
+
+
+def _update_ticker(source, ticker, base_data_path):
+    path = base_data_path.joinpath(f'{ticker}.csv')
+    last_date, last_close = _last_stored_bar(path)
+    if last_date is None:
+        df = source.fetch(ticker)
+        if df.empty:
+            return 0
+        _write_csv(df=df, path=path)
+        return len(df)
+
+    # the last stored bar is fetched again, to check that the stored history still matches the source's adjustment
+    df = source.fetch(ticker, start=last_date)
+    overlap = df.loc[df.index == last_date, 'Close']
+    if len(overlap) == 0 or not np.isclose(overlap.iloc[0], last_close, rtol=close_rtol, atol=close_atol):
+        df = source.fetch(ticker)
+        # a failed or delisted fetch comes back empty or cut short, the stored history is kept then
+        if df.empty:
+            raise ValueError(f'refetched history of {ticker} is empty.')
+        n_refetched = int((df.index <= last_date).sum())
+        n_stored = _n_stored_rows(path)
+        if n_refetched < n_stored:
+            raise ValueError(f'refetched history of {ticker} has {n_refetched} bars up to {last_date.date()}, '
+                             f'{n_stored} are stored.')
+        _write_csv(df=df, path=path)
+        return int((df.index > last_date).sum())
+
+    df = df[df.index > last_date]
+    if df.empty:
+        return 0
+
+    # a single write per ticker, so an interruption cannot leave half of the new bars behind
+    with open(path, 'a', newline='') as f:
+        f.write(df.to_csv(header=False, index_label='Date'))
+    return len(df)
+
+
+def _write_csv(df, path):
+    # written next to path and moved over it, so an interruption leaves the previous file intact
+    tmp_path = path.with_suffix('.tmp')
+    df.to_csv(tmp_path, index_label='Date')
+    os.replace(tmp_path, path)
+
+
+def _n_stored_rows(path):
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    return sum(1 for line in lines[1:] if line.strip())
+
+
+def _last_stored_bar(path, tail_size=4096):
+    # (date, close) of the last row of a CSV file, reading only its header and tail
+    if not path.is_file():
+        return None, None
+    with open(path, 'rb') as f:
+        header = f.readline().decode('utf-8').strip().split(',')
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail_size))
+        lines = [line for line in f.read().decode('utf-8').splitlines() if line.strip()]
+    if not lines or lines[-1].startswith('Date'):
+        return None, None
+    values = lines[-1].split(',')
+    return pd.Timestamp(values[0]), float(values[header.index('Close')])
+
+
+def _normalize(df):
+    df = df[price_columns]
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize().rename('Date')
+    return df.sort_index()
+
+
+class _Checkpoint:
+    # ticker -> number of new bars of the tickers completed so far in the update of run_date, rewritten atomically
+    # after each ticker. the checkpoint of an earlier run_date is stale: its tickers are due for an update again.
+    def __init__(self, path, run_date):
+        self.path = path
+        self.run_date = run_date
+        self.completed = {}
+        if path.is_file():
+            with open(path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('run_date') == run_date:
+                self.completed = checkpoint['completed']
+
+    def complete(self, ticker, n_new):
+        self.completed[ticker] = n_new
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'run_date': self.run_date, 'completed': self.completed}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        self.completed = {}
+        if self.path.is_file():
+            self.path.unlink()
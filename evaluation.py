@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import torch
+
+from rl_env import TradingEnv
+from shared_dataset import SharedDataset
+from ppo import PPO
+from action_sampler import ActionSampler
+from account_management import invariant_checks
+
+
+# evaluation context of a pool worker process (dfs or dataset, env and model), set once by _init_worker
+_context = {}
+
+
+def evaluate_policy(state_dict, dfs, features, allocations, starting_acc_balance, n_start_point_to_ignore,
+                    n_episodes, seed=0, n_workers=1, dataset=None, greedy=False):
+    """
+    Runs n_episodes test episodes of the policy, each on a randomly chosen ticker, and yields (ticker, daily %
+    returns) per episode in episode order. Episode i draws its ticker and actions from generators seeded with
+    (seed, i) only, so the results are identical for any n_workers. If a SharedDataset is given, episodes run on it
+    instead of dfs. With greedy, the most probable action is taken at every step.
+    """
+    context = {'kind': 'policy',
+               'greedy': greedy,
+               'state_dict': state_dict,
+               'dfs': dfs,
+               'features': features,
+               'allocations': allocations,
+               'starting_acc_balance': starting_acc_balance,
+               'n_start_point_to_ignore': n_start_point_to_ignore,
+               'dataset': dataset}
+    tasks = [(seed, i) for i in range(n_episodes)]
+    return _run(context=context, episode_fn=_run_policy_episode, tasks=tasks, n_workers=n_workers)
+
+
+def evaluate_baseline(allocation, dfs, starting_acc_balance, n_start_point_to_ignore, n_workers=1, dataset=None):
+    """
+    Runs one episode with a constant allocation per ticker and yields (ticker, daily % returns) in the order of
+    dfs (or of the tickers of dataset, if given).
+    """
+    context = {'kind': 'baseline',
+               'dfs': dfs,
+               'features': list(dataset.features) if dataset is not None else ['trix'],
+               'allocations': [allocation],
+               'starting_acc_balance': starting_acc_balance,
+               'n_start_point_to_ignore': n_start_point_to_ignore,
+               'dataset': dataset}
+    tasks = dataset.tickers if dataset is not None else list(dfs.keys())
+    return _run(context=context, episode_fn=_run_baseline_episode, tasks=tasks, n_workers=n_workers)
+
+
+def _run(context, episode_fn, tasks, n_workers):
+    # results are yielded lazily but always in task order
+    if n_workers <= 1:
+        # the context stays local, so interleaved evaluations in one process do not share envs or models
+        context = _build_context(context)
+        for task in tasks:
+            yield episode_fn(context, task)
+        return
+
+    if context['dataset'] is not None:
+        yield from _run_pool(context=context, episode_fn=episode_fn, tasks=tasks, n_workers=n_workers)
+        return
+
+    # workers map the precomputed features instead of receiving pickled DataFrames
+    with SharedDataset.create(dfs=context['dfs'], features=context['features']) as dataset:
+        context = dict(context, dfs=None, dataset=dataset)
+        yield from _run_pool(context=context, episode_fn=episode_fn, tasks=tasks, n_workers=n_workers)
+
+
+def _run_pool(context, episode_fn, tasks, n_workers):
+    chunksize = max(1, len(tasks) // (4 * n_workers))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(context,)) as pool:
+        for result in pool.map(partial(_run_in_worker, episode_fn), tasks, chunksize=chunksize):
+            yield result
+
+
+def _init_worker(context):
+    torch.set_num_threads(1)
+    _context.clear()
+    _context.update(_build_context(context))
+
+
+def _run_in_worker(episode_fn, task):
+    return episode_fn(_context, task)
+
+
+def _build_context(context):
+    context = dict(context)
+    context['env'] = TradingEnv(dfs=context['dfs'],
+                                starting_acc_balance=context['starting_acc_balance'],
+                                features=context['features'],
+                                allocations=context['allocations'],
+                                n_start_point_to_ignore=context['n_start_point_to_ignore'],
+                                dataset=context['dataset'])
+
+    if context['kind'] == 'policy':
+        model = PPO(dim_state=len(context['features']), dim_actions=len(context['allocations']))
+        model.load_state_dict(context['state_dict'])
+        model.eval()
+        context['model'] = model
+    return context
+
+
+def _run_policy_episode(context, task):
+    seed, i = task
+    seed_sequence = np.random.SeedSequence([seed, i])
+    env = context['env']
+    env.rng = np.random.default_rng(seed_sequence)
+    sampler = ActionSampler(seed=int(seed_sequence.generate_state(1)[0]))
+    model = context['model']
+    greedy = context['greedy']
+
+    daily_perc_returns = []
+    with invariant_checks(False):
+        s = env.reset()
+        done = False
+        while not done:
+            a, _ = sampler.sample(model.pi_numpy(s), greedy=greedy)
+            s, r, done = env.step(int(a))
+            daily_perc_returns.append(r * 100)
+
+    return str(env.curr_ticker), daily_perc_returns
+
+
+def _run_baseline_episode(context, ticker):
+    env = context['env']
+
+    daily_perc_returns = []
+    with invariant_checks(False):
+        env.reset(ticker=ticker)
+        done = False
+        while not done:
+            s_prime, r, done = env.step(0)
+            daily_perc_returns.append(r * 100)
+
+    return ticker, daily_perc_returns
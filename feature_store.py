@@ -0,0 +1,51 @@
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+from features import attach_features, get_feature_key
+
+
+FeatureFrame = namedtuple('FeatureFrame', ['dates', 'close', 'values'])
+
+
+class FeatureStore:
+    """
+    Computes the feature frame of a ticker once and keeps it as a contiguous float32 array (one row per date, one
+    column per feature). Entries are keyed by ticker, date range and feature parameters and evicted least recently
+    used first once more than max_entries are held.
+    """
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticker, df, features):
+        key = (ticker, df.index[0], df.index[-1], len(df), get_feature_key(features))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = self._compute(df=df, features=features)
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+    @staticmethod
+    def _compute(df, features):
+        df = df[['Open', 'High', 'Low', 'Close', 'Volume']].copy()
+        attach_features(df=df, features=features)
+
+        dates = df.index.values
+        close = np.ascontiguousarray(df['Close'].values, dtype=np.float64)
+        values = np.ascontiguousarray(df[list(features)].values, dtype=np.float32)
+        for a in (dates, close, values):
+            a.setflags(write=False)
+
+        return FeatureFrame(dates=dates, close=close, values=values)
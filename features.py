@@ -1,5 +1,5 @@
-import pandas as pd
 import numpy as np
+from scipy.signal import lfilter
 
 
 def get_state_for_policy(df, day, features):
@@ -7,59 +7,21 @@ def get_state_for_policy(df, day, features):
     return state
 
 
-def attach_features(df):
-    """
-    _attach_adx(df=df, periods=14)
-    """
-    _attach_sma(df=df)
-    _attach_trix(df=df, periods=15)
-    _attach_rsi(df=df, periods=14)
-    _attach_cci(df=df, periods=20, c=0.015)
-    _attach_aroon(df=df, periods=15)
-    _attach_bollinger_bands(df=df)
-    _attach_stoch(df=df, k_periods=14, d_periods=3)
-    _attach_macd(df=df, signal_periods=9, fast_periods=12, slow_periods=26)
-
-
-def set_pre_action_cols(df, day, pre_account):
-    df.at[day, 'pre_total'] = pre_account.total()
-    df.at[day, 'pre_fixed'] = pre_account.fixed
-    df.at[day, 'pre_floating'] = pre_account.floating
-    df.at[day, 'pre_alloc'] = pre_account.alloc()
-    df.at[day, 'pre_units'] = pre_account.units
-    df.at[day, 'pre_account'] = pre_account
-
-
-def set_post_action_cols(df, day, post_account, target_alloc):
-    df.at[day, 'policy_alloc'] = target_alloc
-
-    df.at[day, 'post_total'] = post_account.total()
-    df.at[day, 'post_fixed'] = post_account.fixed
-    df.at[day, 'post_floating'] = post_account.floating
-    df.at[day, 'post_alloc'] = post_account.alloc()
-    df.at[day, 'post_units'] = post_account.units
-    df.at[day, 'post_account'] = post_account
+def attach_features(df, features=None):
+    if features is None:
+        features = feature_specs.keys()
 
+    attached = []
+    for feature in features:
+        attach, params = feature_specs[feature]
+        if (attach, params) in attached:
+            continue
+        attach(df=df, **params)
+        attached.append((attach, params))
 
-def attach_empty_training_cols(df):
-    df['pre_fixed'] = np.nan
-    df['pre_floating'] = np.nan
-    df['pre_total'] = np.nan
-    df['pre_alloc'] = np.nan
-    df['pre_units'] = np.nan
 
-    df['policy_alloc'] = np.nan
-
-    df['post_fixed'] = np.nan
-    df['post_floating'] = np.nan
-    df['post_total'] = np.nan
-    df['post_alloc'] = np.nan
-    df['post_units'] = np.nan
-
-    df['pre_account'] = np.nan
-    df['post_account'] = np.nan
-
-    df['reward'] = np.nan
+def get_feature_key(features):
+    return tuple((feature, tuple(sorted(feature_specs[feature][1].items()))) for feature in features)
 
 
 def _attach_sma(df):
@@ -97,18 +59,6 @@ def _attach_rsi(df, periods=14):
     df['rsi'] = (rsi / 100) - 0.5
 
 
-def _get_min_max(x1, x2, f='min'):
-    if not np.isnan(x1) and not np.isnan(x2):
-        if f == 'max':
-            return max(x1, x2)
-        elif f == 'min':
-            return min(x1, x2)
-        else:
-            raise ValueError('"f" variable value should be "min" or "max"')
-    else:
-        return np.nan
-
-
 def _attach_trix(df, periods=15):
     single_smoothed = df['Close'].ewm(span=periods, min_periods=periods).mean()
     double_smoothed = single_smoothed.ewm(span=periods, min_periods=periods).mean()
@@ -135,9 +85,13 @@ def _attach_cci(df, periods=20, c=0.015):
     http://stockcharts.com/school/doku.php?id=chart_school:technical_indicators:commodity_channel_index_cci
     """
     typical_price = (df['High'] + df['Low'] + df['Close']) / 3.0
-    mean_abs_deviation = lambda x: np.mean(np.abs(x-np.mean(x)))
+
+    windows = _rolling_windows(typical_price.values, periods)
+    mean_abs_deviation = np.full(len(typical_price), np.nan)
+    mean_abs_deviation[periods - 1:] = np.abs(windows - windows.mean(axis=1, keepdims=True)).mean(axis=1)
+
     cci = ((typical_price - typical_price.rolling(periods, min_periods=periods).mean())
-           / (c * typical_price.rolling(periods, min_periods=0).apply(mean_abs_deviation, True)))
+           / (c * mean_abs_deviation))
     df['cci'] = cci / 200
 
 
@@ -145,68 +99,66 @@ def _attach_aroon(df, periods=15):
     """
     https://school.stockcharts.com/doku.php?id=technical_indicators:aroon_oscillator
     """
-    aroon_up = df['Close'].rolling(periods, min_periods=periods).apply(lambda x: float(np.argmax(x) + 1) / periods * 100,
-                                                                 raw=True)
-    aroon_down = df['Close'].rolling(periods, min_periods=0).apply(lambda x: float(np.argmin(x) + 1) / periods * 100,
-                                                             raw=True)
-    df['aroon'] = (aroon_up - aroon_down) / 100
+    windows = _rolling_windows(df['Close'].values, periods)
+    aroon_up = (np.argmax(windows, axis=1) + 1) / periods * 100
+    aroon_down = (np.argmin(windows, axis=1) + 1) / periods * 100
+
+    aroon = np.full(len(df), np.nan)
+    aroon[periods - 1:] = np.where(np.isnan(windows).any(axis=1), np.nan, (aroon_up - aroon_down) / 100)
+    df['aroon'] = aroon
+
+
+def _rolling_windows(values, periods):
+    # read-only (len(values) - periods + 1, periods) view, row i holding values[i:i + periods]
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < periods:
+        return np.empty((0, periods))
+    return np.lib.stride_tricks.sliding_window_view(values, periods)
 
 
 def _attach_adx(df, periods=14):
     """
     http://stockcharts.com/school/doku.php?id=chart_school:technical_indicators:average_directional_index_adx
     """
-    cs = df['Close'].shift(1)
-    pdm = df['High'].combine(cs, lambda x1, x2: _get_min_max(x1, x2, 'max'))
-    pdn = df['Low'].combine(cs, lambda x1, x2: _get_min_max(x1, x2, 'min'))
-    tr = pdm - pdn
-
-    trs_initial = np.zeros(periods - 1)
-    trs = np.zeros(len(df['Close']) - (periods - 1))
-    trs[0] = tr.dropna()[0:periods].sum()
-    tr = tr.reset_index(drop=True)
-    for i in range(1, len(trs)-1):
-        trs[i] = trs[i-1] - (trs[i-1] / float(periods)) + tr[periods + i]
-
-    up = df['High'] - df['High'].shift(1)
-    dn = df['Low'].shift(1) - df['Low']
-    pos = abs(((up > dn) & (up > 0)) * up)
-    neg = abs(((dn > up) & (dn > 0)) * dn)
+    high = df['High'].values.astype(np.float64)
+    low = df['Low'].values.astype(np.float64)
+    close = df['Close'].values.astype(np.float64)
 
-    dip_mio = np.zeros(len(df['Close']) - (periods - 1))
-    dip_mio[0] = pos.dropna()[0:periods].sum()
+    adx = np.full(len(df), np.nan)
+    if len(df) >= 2 * periods:
+        # true range and directional movement, defined from the second bar on
+        tr = np.maximum(high[1:], close[:-1]) - np.minimum(low[1:], close[:-1])
+        up = high[1:] - high[:-1]
+        dn = low[:-1] - low[1:]
+        pos = np.where((up > dn) & (up > 0), up, 0.0)
+        neg = np.where((dn > up) & (dn > 0), dn, 0.0)
 
-    pos = pos.reset_index(drop=True)
-    for i in range(1, len(dip_mio)-1):
-        dip_mio[i] = dip_mio[i-1] - (dip_mio[i-1] / float(periods)) + pos[periods + i]
+        # flat stretches (no range, no movement) count as dx = 0 instead of poisoning the smoothing with NaN
+        trs = _wilder_sum(tr, periods)
+        dip = 100 * np.divide(_wilder_sum(pos, periods), trs, out=np.zeros_like(trs), where=trs > 0)
+        din = 100 * np.divide(_wilder_sum(neg, periods), trs, out=np.zeros_like(trs), where=trs > 0)
+        dx = 100 * np.abs(np.divide(dip - din, dip + din, out=np.zeros_like(trs), where=dip + din > 0))
 
-    din_mio = np.zeros(len(df['Close']) - (periods - 1))
-    din_mio[0] = neg.dropna()[0:periods].sum()
+        # dx[i] belongs to bar i + periods, the first adx value to bar 2 * periods - 1
+        adx[2 * periods - 1:] = _wilder_mean(dx, periods)
 
-    neg = neg.reset_index(drop=True)
-    for i in range(1, len(din_mio)-1):
-        din_mio[i] = din_mio[i-1] - (din_mio[i-1] / float(periods)) + neg[periods + i]
+    df['adx'] = adx / 100
 
-    dip = np.zeros(len(trs))
-    for i in range(len(trs)):
-        dip[i] = 100 * (dip_mio[i]/trs[i])
 
-    din = np.zeros(len(trs))
-    for i in range(len(trs)):
-        din[i] = 100 * (din_mio[i]/trs[i])
+def _wilder_sum(x, periods):
+    # s[0] = sum(x[:periods]), s[i] = s[i - 1] - s[i - 1] / periods + x[i + periods - 1]
+    decay = 1 - 1 / periods
+    first = x[:periods].sum()
+    rest, _ = lfilter([1.0], [1.0, -decay], x[periods:], zi=[decay * first])
+    return np.concatenate(([first], rest))
 
-    dx = 100 * np.abs((dip - din) / (dip + din))
 
-    adx = np.zeros(len(trs))
-    adx[periods] = dx[0:periods].mean()
-
-    for i in range(periods + 1, len(adx)):
-        adx[i] = ((adx[i-1] * (periods - 1)) + dx[i - 1]) / float(periods)
-
-    adx = np.concatenate((trs_initial, adx), axis=0)
-    adx = pd.Series(data=adx, index=df['Close'].index)
-
-    df['adx'] = adx
+def _wilder_mean(x, periods):
+    # m[0] = mean(x[:periods]), m[i] = (m[i - 1] * (periods - 1) + x[i + periods - 1]) / periods
+    decay = (periods - 1) / periods
+    first = x[:periods].mean()
+    rest, _ = lfilter([1 / periods], [1.0, -decay], x[periods:], zi=[decay * first])
+    return np.concatenate(([first], rest))
 
 
 def _attach_macd(df, signal_periods=9, fast_periods=12, slow_periods=26):
@@ -222,4 +174,20 @@ def _attach_macd(df, signal_periods=9, fast_periods=12, slow_periods=26):
     df['macd_line'] = macd_line
     df['macd_signal'] = macd_signal
     df['macd_trend'] = macd_trend
-    """
\ No newline at end of file
+    """
+
+
+# feature column -> (attach function, parameters). features sharing an attach function and parameters
+# (e.g. 'sma_5/10' and 'sma_5/30') are computed together.
+feature_specs = {
+    'sma_5/10': (_attach_sma, {}),
+    'sma_5/30': (_attach_sma, {}),
+    'trix': (_attach_trix, {'periods': 15}),
+    'rsi': (_attach_rsi, {'periods': 14}),
+    'cci': (_attach_cci, {'periods': 20, 'c': 0.015}),
+    'aroon': (_attach_aroon, {'periods': 15}),
+    'perc_bb': (_attach_bollinger_bands, {}),
+    'stoch': (_attach_stoch, {'k_periods': 14, 'd_periods': 3}),
+    'macd': (_attach_macd, {'signal_periods': 9, 'fast_periods': 12, 'slow_periods': 26}),
+    'adx': (_attach_adx, {'periods': 14}),
+}
@@ -0,0 +1,247 @@
+from collections import deque
+from pathlib import Path
+import json
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import numpy as np
+import torch
+
+from ppo import PPO
+from streaming_features import StreamingFeatures
+
+
+class InferenceServer:
+    """
+    Serves target allocations of trained PPO policies. models maps a model name to a dict with the checkpoint
+    'path' (a state dict saved by runs.train) and the 'features' and 'allocations' it was trained with; every
+    checkpoint is loaded once.
+
+    Requests hold either feature vectors (states: ticker -> features) or new daily bars (bars: ticker -> {'high',
+    'low', 'close', 'date'}), from which per ticker StreamingFeatures compute the state. Requests are queued and a
+    single thread micro-batches them: all states queued within max_wait seconds (up to max_batch_size) go through one
+    policy forward pass per model, and the most probable action of each is mapped to its allocation. Tickers whose
+    state is not finite yet (e.g. during the indicators' warm-up) get allocation None.
+    """
+    def __init__(self, models, max_batch_size=1024, max_wait=0.002, n_latencies=10000):
+        self.models = {}
+        for name, spec in models.items():
+            state_dict = torch.load(spec['path'])
+            model = PPO(dim_state=state_dict['fc1.weight'].shape[1], dim_actions=state_dict['fc_pi.weight'].shape[0])
+            model.load_state_dict(state_dict)
+            model.eval()
+            actions_to_alloc = {i: spec['allocations'][i] for i in range(len(spec['allocations']))}
+            self.models[name] = {'model': model, 'features': list(spec['features']),
+                                 'actions_to_alloc': actions_to_alloc, 'streams': {}}
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=n_latencies)
+        self.n_requests = 0
+        self.n_batches = 0
+        self.stop = threading.Event()
+        self.thread = None
+        self.tcp_server = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.tcp_server is not None:
+            self.tcp_server.shutdown()
+            self.tcp_server.server_close()
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def predict(self, model, states=None, bars=None, timeout=None):
+        """
+        Returns {'allocations': ticker -> allocation (or None), 'actions': ticker -> action (or None)}.
+        """
+        if model not in self.models:
+            raise KeyError(f'unknown model {model}.')
+        n_features = len(self.models[model]['features'])
+        for ticker, state in (states or {}).items():
+            if len(state) != n_features:
+                raise ValueError(f'state of {ticker} has {len(state)} values, model {model} expects {n_features}.')
+        request = _Request(model=model, states=states or {}, bars=bars or {})
+        self.requests.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f'no response within {timeout} s.')
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        return {'n_requests': self.n_requests,
+                'n_batches': self.n_batches,
+                'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None}
+
+    def serve(self, host='127.0.0.1', port=0):
+        """
+        Accepts newline delimited JSON requests over TCP, each either {"model": ..., "states": ...} or
+        {"model": ..., "bars": ...} as for predict, or {"stats": true}, and answers each with one JSON line. Returns
+        the (host, port) the server listens on.
+        """
+        self.tcp_server = _TCPServer((host, port), _RequestHandler)
+        self.tcp_server.inference_server = self
+        threading.Thread(target=self.tcp_server.serve_forever, daemon=True).start()
+        return self.tcp_server.server_address
+
+    def _run(self):
+        while not self.stop.is_set():
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            # keep collecting until the batch is full or max_wait has passed since its first request
+            deadline = time.perf_counter() + self.max_wait
+            n_rows = batch[0].n_rows()
+            while n_rows < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(0., deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n_rows += request.n_rows()
+
+            self._process(batch)
+
+    def _process(self, batch):
+        for name in set(request.model for request in batch):
+            requests = [request for request in batch if request.model == name]
+            try:
+                self._forward(self.models[name], requests)
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+
+        now = time.perf_counter()
+        for request in batch:
+            self.latencies.append(now - request.start)
+            request.done.set()
+        self.n_requests += len(batch)
+        self.n_batches += 1
+
+    @staticmethod
+    def _forward(entry, requests):
+        # bars are applied in request order, so a ticker's streaming features see its bars in submission order
+        tickers = []
+        states = []
+        for request in requests:
+            request_states = {ticker: np.asarray(state, dtype=np.float32) for ticker, state in request.states.items()}
+            for ticker, bar in request.bars.items():
+                streams = entry['streams']
+                if ticker not in streams:
+                    streams[ticker] = StreamingFeatures(features=entry['features'])
+                request_states[ticker] = streams[ticker].update(high=float(bar['high']), low=float(bar['low']),
+                                                                close=float(bar['close']), date=bar.get('date'))
+            tickers.append(list(request_states.keys()))
+            states.extend(request_states.values())
+
+        states = np.array(states, dtype=np.float32).reshape(len(states), len(entry['features']))
+        valid = np.isfinite(states).all(axis=1)
+        actions = np.full(len(states), -1)
+        if valid.any():
+            actions[valid] = entry['model'].pi_numpy(states[valid]).argmax(axis=1)
+
+        row = 0
+        for request, request_tickers in zip(requests, tickers):
+            request_actions = actions[row:row + len(request_tickers)]
+            row += len(request_tickers)
+            request.result = {
+                'allocations': {ticker: entry['actions_to_alloc'][int(a)] if a >= 0 else None
+                                for ticker, a in zip(request_tickers, request_actions)},
+                'actions': {ticker: int(a) if a >= 0 else None for ticker, a in zip(request_tickers, request_actions)}}
+
+
+class InferenceClient:
+    """
+    Client of InferenceServer.serve, one request at a time over a persistent connection.
+    """
+    def __init__(self, host, port):
+        self.socket = socket.create_connection((host, port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile('rwb')
+
+    def predict(self, model, states=None, bars=None):
+        return self._send({'model': model, 'states': states or {}, 'bars': bars or {}})
+
+    def stats(self):
+        return self._send({'stats': True})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def _send(self, message):
+        self.file.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+
+class _Request:
+    __slots__ = ('model', 'states', 'bars', 'start', 'done', 'result', 'error')
+
+    def __init__(self, model, states, bars):
+        self.model = model
+        self.states = states
+        self.bars = bars
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def n_rows(self):
+        return len(self.states) + len(self.bars)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        inference_server = self.server.inference_server
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                if message.get('stats'):
+                    response = inference_server.stats()
+                else:
+                    response = inference_server.predict(model=message['model'], states=message.get('states'),
+                                                        bars=message.get('bars'))
+            except Exception as e:
+                response = {'error': repr(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+if __name__ == '__main__':
+    # python inference_server.py models.json [port], models.json mapping model names to path, features, allocations
+    with open(Path(sys.argv[1])) as f:
+        models = json.load(f)
+    server = InferenceServer(models=models).start()
+    host, port = server.serve(port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    print(f'serving {len(models)} models on {host}:{port}.')
+    try:
+        while True:
+            time.sleep(60)
+            print(server.stats())
+    except KeyboardInterrupt:
+        server.close()
@@ -1,7 +1,9 @@
 import pandas as pd
 from pathlib import Path
-from data_management import download_dfs, save_dfs, load_dfs, filter_dfs, train_test_split
+from data_management import download_dfs, save_dfs, load_dfs, filter_dfs, train_test_split, walk_forward_folds
+from downloader import update_data
 from runs import train, test, test_baseline
+from walk_forward import run_walk_forward
 
 
 pd.set_option('display.max_columns', None)
@@ -19,52 +21,79 @@ min_last_date = pd.Timestamp('2019-10-31')
 train_test_split_date = pd.Timestamp('2015-01-01')
 min_ts_len = 3000
 
-# dfs = download_dfs(tickers=accepted_tickers)
-# save_dfs(dfs=dfs, base_data_path=base_data_path)
-loaded_dfs = load_dfs(base_data_path=base_data_path, accepted_tickers=accepted_tickers)
-filtered_dfs = filter_dfs(dfs=loaded_dfs,
-                          min_ts_len=min_ts_len,
-                          max_days_break=max_days_break,
-                          max_first_date=max_first_date,
-                          min_last_date=min_last_date,
-                          min_first_date=min_first_date,
-                          n_rows_to_remove_start=300)
+# the workers of the parallel runs (n_workers > 1) import this module, so it only does work when run as a script
+if __name__ == '__main__':
+    # dfs = download_dfs(tickers=accepted_tickers)
+    # save_dfs(dfs=dfs, base_data_path=base_data_path)
+    # update_data(tickers=accepted_tickers, base_data_path=base_data_path)
+    loaded_dfs = load_dfs(base_data_path=base_data_path, accepted_tickers=accepted_tickers)
+    filtered_dfs, filter_report = filter_dfs(dfs=loaded_dfs,
+                                             min_ts_len=min_ts_len,
+                                             max_days_break=max_days_break,
+                                             max_first_date=max_first_date,
+                                             min_last_date=min_last_date,
+                                             min_first_date=min_first_date,
+                                             n_rows_to_remove_start=300)
+    rejected = filter_report['reason'].notna()
+    print(filter_report[rejected])
+    print(f'remaining: {len(filter_report)} - {rejected.sum()} = {len(filtered_dfs)} dfs '
+          f'({filter_report.loc[~rejected, "n_points"].sum()} data points).')
 
-train_dfs, test_dfs = train_test_split(dfs=filtered_dfs, split_date=train_test_split_date)
+    train_dfs, test_dfs = train_test_split(dfs=filtered_dfs, split_date=train_test_split_date)
 
-# ======== TRAINING PPO ===========
-n_start_point_to_ignore_train = 2000
-allocations = [-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]
-features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
-model_name = 'input=[trix, rsi, cci, aroon, perc_bb] output=[-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]'
-model_path = Path(f'.\\models\\{model_name}.pt')
-results_path = Path(f'.\\testing_results\\{model_name}.csv')
-train(allocations=allocations,
-      features=features,
-      model_path=model_path,
-      dfs=train_dfs,
-      n_start_point_to_ignore=n_start_point_to_ignore_train)
+    # ======== TRAINING PPO ===========
+    n_start_point_to_ignore_train = 2000
+    n_workers_train = 1
+    allocations = [-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]
+    features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+    model_name = 'input=[trix, rsi, cci, aroon, perc_bb] output=[-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]'
+    model_path = Path(f'.\\models\\{model_name}.pt')
+    results_path = Path(f'.\\testing_results\\{model_name}.csv')
+    train(allocations=allocations,
+          features=features,
+          model_path=model_path,
+          dfs=train_dfs,
+          n_start_point_to_ignore=n_start_point_to_ignore_train,
+          n_workers=n_workers_train,
+          metrics_path=Path(f'.\\training_results\\{model_name}'))
 
 
-# ======== TESTING PPO ===========
-allocations = [-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]
-features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
-model_name = 'input=[trix, rsi, cci, aroon, perc_bb] output=[-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]'
-model_path = Path(f'.\\models\\{model_name}.pt')
-results_path = Path(f'.\\testing_results\\{model_name}.csv')
-n_start_point_to_ignore_test = 100
-test(allocations=allocations,
-     features=features,
-     model_path=model_path,
-     dfs=test_dfs,
-     results_path=results_path,
-     n_start_point_to_ignore=n_start_point_to_ignore_test)
+    # ======== TESTING PPO ===========
+    allocations = [-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]
+    features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+    model_name = 'input=[trix, rsi, cci, aroon, perc_bb] output=[-0.6, -0.3, -0.1, 0.0, 0.1, 0.3, 0.6]'
+    model_path = Path(f'.\\models\\{model_name}.pt')
+    results_path = Path(f'.\\testing_results\\{model_name}.csv')
+    n_start_point_to_ignore_test = 100
+    n_workers_test = 4
+    test(allocations=allocations,
+         features=features,
+         model_path=model_path,
+         dfs=test_dfs,
+         results_path=results_path,
+         n_start_point_to_ignore=n_start_point_to_ignore_test,
+         n_workers=n_workers_test)
 
-# ======== TESTING BUY AND HOLD ===========
-baseline_allocation = 0.8
-results_path = Path(f'.\\testing_results\\{str(baseline_allocation)}.csv')
-n_start_point_to_ignore_test = 100
-test_baseline(allocation=baseline_allocation,
-              dfs=test_dfs,
-              results_path=results_path,
-              n_start_point_to_ignore=n_start_point_to_ignore_test)
+    # ======== TESTING BUY AND HOLD ===========
+    baseline_allocation = 0.8
+    results_path = Path(f'.\\testing_results\\{str(baseline_allocation)}.csv')
+    n_start_point_to_ignore_test = 100
+    test_baseline(allocation=baseline_allocation,
+                  dfs=test_dfs,
+                  results_path=results_path,
+                  n_start_point_to_ignore=n_start_point_to_ignore_test,
+                  n_workers=n_workers_test)
+
+    # ======== WALK-FORWARD ===========
+    # folds = walk_forward_folds(first_test_date=pd.Timestamp('2012-01-01'),
+    #                            last_test_date=pd.Timestamp('2019-10-31'),
+    #                            test_period=pd.DateOffset(years=1),
+    #                            train_period=pd.DateOffset(years=10))
+    # run_walk_forward(dfs=filtered_dfs,
+    #                  folds=folds,
+    #                  allocations=allocations,
+    #                  features=features,
+    #                  models_path=Path('./models/walk_forward/'),
+    #                  results_path=Path('./testing_results/walk_forward/walk_forward.csv'),
+    #                  baseline_allocation=baseline_allocation,
+    #                  n_workers=n_workers_test)
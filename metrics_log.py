@@ -0,0 +1,163 @@
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from streaming_features import Ewm
+
+
+columns_file_name = 'columns.json'
+# per episode training metrics written by runs.train: losses are means over the episode's train_net updates
+metrics_cols = [('episode', 'int64'),
+                ('steps', 'int64'),
+                ('total_steps', 'int64'),
+                ('mean', 'float64'),
+                ('std', 'float64'),
+                ('policy_loss', 'float64'),
+                ('value_loss', 'float64'),
+                ('n_updates', 'int64'),
+                ('episode_seconds', 'float64'),
+                ('train_seconds', 'float64'),
+                ('time', 'float64')]
+
+
+class MetricsLog:
+    """
+    Append-only columnar log: a directory with one raw binary file per column (see metrics_cols) and a
+    columns.json file describing them. Records are buffered and each column file is appended once per flush_every
+    records (and on flush/close), so logging costs a few list appends per record. Appending to an existing log
+    continues it. A record counts as written once it is in every column file, so readers (MetricsReader) never see
+    a partial one.
+    """
+    def __init__(self, path, columns=None, flush_every=64):
+        self.path = Path(path)
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in (metrics_cols if columns is None else columns)]
+        self.flush_every = flush_every
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        columns_path = self.path.joinpath(columns_file_name)
+        description = [[name, dtype.str] for name, dtype in self.columns]
+        if columns_path.is_file():
+            with open(columns_path) as f:
+                if json.load(f) != description:
+                    raise ValueError(f'log {self.path} has different columns.')
+            # drop a record left partially written by an interrupted flush
+            n_rows = _n_rows(self.path, self.columns)
+            for name, dtype in self.columns:
+                column_path = self.path.joinpath(f'{name}.bin')
+                if column_path.is_file():
+                    with open(column_path, 'r+b') as f:
+                        f.truncate(n_rows * dtype.itemsize)
+        else:
+            with open(columns_path, 'w') as f:
+                json.dump(description, f)
+
+        self.files = {name: open(self.path.joinpath(f'{name}.bin'), 'ab') for name, _ in self.columns}
+        self.buffer = {name: [] for name, _ in self.columns}
+        self.n_buffered = 0
+
+    def append(self, **record):
+        # missing values are NaN, or -1 in integer columns
+        for name, dtype in self.columns:
+            self.buffer[name].append(record.get(name, np.nan if dtype.kind == 'f' else -1))
+        self.n_buffered += 1
+        if self.n_buffered >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.n_buffered == 0:
+            return
+        for name, dtype in self.columns:
+            f = self.files[name]
+            f.write(np.array(self.buffer[name], dtype=dtype).tobytes())
+            f.flush()
+            self.buffer[name] = []
+        self.n_buffered = 0
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MetricsReader:
+    """
+    Reads a MetricsLog incrementally: every read returns the records appended since the previous one as a
+    DataFrame, reading only the new bytes of each column file.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path.joinpath(columns_file_name)) as f:
+            self.columns = [(name, np.dtype(dtype)) for name, dtype in json.load(f)]
+        self.files = {name: open(self.path.joinpath(f'{name}.bin'), 'rb') for name, _ in self.columns}
+        self.n_rows = 0
+
+    def read(self):
+        n_rows = _n_rows(self.path, self.columns)
+        n_new = n_rows - self.n_rows
+        data = {}
+        for name, dtype in self.columns:
+            f = self.files[name]
+            f.seek(self.n_rows * dtype.itemsize)
+            data[name] = np.frombuffer(f.read(n_new * dtype.itemsize), dtype=dtype)
+        self.n_rows = n_rows
+        return pd.DataFrame(data, index=pd.RangeIndex(n_rows - n_new, n_rows))
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class MetricsTail:
+    """
+    MetricsReader that also keeps the exponential moving averages of training_results.py (mean_ema, std_ema and
+    sharpe_ratio_ema, as pandas' ewm(span, min_periods)) up to date, so a running sweep can be followed without
+    rereading or recomputing its history.
+    """
+    def __init__(self, path, span=100, min_periods=10):
+        self.reader = MetricsReader(path)
+        self.mean_ewm = Ewm(com=(span - 1) / 2., min_periods=min_periods)
+        self.std_ewm = Ewm(com=(span - 1) / 2., min_periods=min_periods)
+
+    def read(self):
+        df = self.reader.read()
+        df['mean_ema'] = [self.mean_ewm.update(float(x)) for x in df['mean'].values]
+        df['std_ema'] = [self.std_ewm.update(float(x)) for x in df['std'].values]
+        df['sharpe_ratio_ema'] = df['mean_ema'] / df['std_ema']
+        return df
+
+    def close(self):
+        self.reader.close()
+
+
+def _n_rows(path, columns):
+    # the shortest column bounds the complete records, a flush may be half done
+    n_rows = []
+    for name, dtype in columns:
+        column_path = path.joinpath(f'{name}.bin')
+        n_rows.append(column_path.stat().st_size // dtype.itemsize if column_path.is_file() else 0)
+    return min(n_rows)
+
+
+if __name__ == '__main__':
+    # python metrics_log.py path [interval]: prints new episodes of a training run's log as they are written
+    tail = MetricsTail(Path(sys.argv[1]))
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    try:
+        while True:
+            for row in tail.read().itertuples():
+                print('episode: {}, steps: {}, mean: {:.3f}%, std: {:.3f}%, mean_ema: {:.3f}%, '
+                      'sharpe_ratio_ema: {:.3f}, policy_loss: {:.4f}, value_loss: {:.6f}'.format(
+                          row.episode, row.steps, row.mean, row.std, row.mean_ema, row.sharpe_ratio_ema,
+                          row.policy_loss, row.value_loss))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        tail.close()
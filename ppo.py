@@ -1,10 +1,14 @@
 import gym
+import numpy as np
+from scipy.signal import lfilter
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 from torch.distributions import Categorical
 
+from rollout_buffer import RolloutBuffer
+
 
 # Hyperparameters
 learning_rate = 0.001
@@ -12,17 +16,20 @@ gamma = 0.95
 lmbda = 0.95
 eps_clip = 0.1
 K_epoch = 3
+# initial capacity of the put_data buffer, doubled whenever more transitions are queued before train_net
+buffer_capacity = 1024
 
 
 class PPO(nn.Module):
     def __init__(self, dim_state, dim_actions):
         super(PPO, self).__init__()
-        self.data = []
+        self.buffer = RolloutBuffer(capacity=buffer_capacity, dim_state=dim_state, growable=True)
 
         self.fc1 = nn.Linear(dim_state, dim_state * 3)
         self.fc_pi = nn.Linear(dim_state * 3, dim_actions)
         self.fc_v = nn.Linear(dim_state * 3, 1)
         self.optimizer = optim.Adam(self.parameters(), lr=learning_rate)
+        self.export_weights()
 
     def pi(self, x, softmax_dim=0):
         x = F.relu(self.fc1(x))
@@ -35,56 +42,99 @@ class PPO(nn.Module):
         v = self.fc_v(x)
         return v
 
+    def pi_v(self, x, softmax_dim=0):
+        # both heads on one hidden layer pass
+        x = F.relu(self.fc1(x))
+        prob = F.softmax(self.fc_pi(x), dim=softmax_dim)
+        v = self.fc_v(x)
+        return prob, v
+
+    def pi_numpy(self, x):
+        """
+        pi of a float32 state, or of a batch of states along the last axis, computed with numpy on the weights of the
+        last export_weights. For rollouts and tests, where torch's per call overhead dwarfs the few multiply-adds.
+        """
+        w1, b1, w_pi, b_pi = self.numpy_weights
+        h = x @ w1
+        h += b1
+        np.maximum(h, 0, out=h)
+        logits = h @ w_pi
+        logits += b_pi
+        logits -= logits.max(axis=-1, keepdims=True)
+        prob = np.exp(logits, out=logits)
+        prob /= prob.sum(axis=-1, keepdims=True)
+        return prob
+
+    def export_weights(self):
+        # called after every train_net and load_state_dict, call it after changing the parameters otherwise
+        with torch.no_grad():
+            # copies: the 1-d biases would otherwise stay views that in-place optimizer steps change
+            self.numpy_weights = tuple(np.array(w.detach().numpy().T, dtype=np.float32, order='C', copy=True)
+                                       for w in (self.fc1.weight, self.fc1.bias, self.fc_pi.weight, self.fc_pi.bias))
+
+    def load_state_dict(self, state_dict, strict=True):
+        result = super(PPO, self).load_state_dict(state_dict, strict=strict)
+        self.export_weights()
+        return result
+
     def put_data(self, transition):
-        self.data.append(transition)
+        s, a, r, s_prime, prob_a, done = transition
+        self.buffer.add(s=s, a=a, r=r, s_prime=s_prime, log_prob_a=np.log(prob_a), done=done)
 
     def make_batch(self):
-        s_lst, a_lst, r_lst, s_prime_lst, prob_a_lst, done_lst = [], [], [], [], [], []
-        for transition in self.data:
-            s, a, r, s_prime, prob_a, done = transition
-
-            s_lst.append(s)
-            a_lst.append([a])
-            r_lst.append([r])
-            s_prime_lst.append(s_prime)
-            prob_a_lst.append([prob_a])
-            done_mask = 0 if done else 1
-            done_lst.append([done_mask])
-
-        s = torch.tensor(s_lst, dtype=torch.float)
-        a = torch.tensor(a_lst)
-        r = torch.tensor(r_lst)
-        s_prime = torch.tensor(s_prime_lst, dtype=torch.float)
-        done_mask = torch.tensor(done_lst, dtype=torch.float)
-        prob_a = torch.tensor(prob_a_lst)
-
-        self.data = []
-        return s, a, r, s_prime, done_mask, prob_a
-
-    def train_net(self):
-        s, a, r, s_prime, done_mask, prob_a = self.make_batch()
+        # views of the buffer, valid until the next put_data
+        batch = self.buffer.get(0)
+        self.buffer.clear()
+        return batch
+
+    def train_net(self, batch=None):
+        """
+        batch is (s, a, r, s_prime, done_mask, log_prob_a) as returned by RolloutBuffer.get, (T, ...) or (T, N, ...)
+        with N independent trajectories; without it, the transitions passed to put_data are used. Returns the policy
+        and value loss of the last epoch.
+        """
+        s, a, r, s_prime, done_mask, log_prob_a = self.make_batch() if batch is None else batch
+
+        # targets and advantages come from the value function before the update and are computed once per batch
+        with torch.no_grad():
+            v = self.v(torch.cat([s, s_prime]))
+            td_target = r + gamma * v[len(s):] * done_mask
+            delta = td_target - v[:len(s)]
+        advantage = torch.from_numpy(get_advantages(delta=delta.numpy(), done_mask=done_mask.numpy()))
 
         for i in range(K_epoch):
-            td_target = r + gamma * self.v(s_prime) * done_mask
-            delta = td_target - self.v(s)
-            delta = delta.detach().numpy()
-
-            advantage_lst = []
-            advantage = 0.0
-            for delta_t in delta[::-1]:
-                advantage = gamma * lmbda * advantage + delta_t[0]
-                advantage_lst.append([advantage])
-            advantage_lst.reverse()
-            advantage = torch.tensor(advantage_lst, dtype=torch.float)
-
-            pi = self.pi(s, softmax_dim=1)
-            pi_a = pi.gather(1, a)
-            ratio = torch.exp(torch.log(pi_a) - torch.log(prob_a))  # a/b == exp(log(a)-log(b))
+            pi, v = self.pi_v(s, softmax_dim=-1)
+            pi_a = pi.gather(-1, a)
+            ratio = torch.exp(torch.log(pi_a) - log_prob_a)  # a/b == exp(log(a)-log(b))
 
             surr1 = ratio * advantage
             surr2 = torch.clamp(ratio, 1 - eps_clip, 1 + eps_clip) * advantage
-            loss = -torch.min(surr1, surr2) + F.smooth_l1_loss(self.v(s), td_target.detach())
+            policy_loss = -torch.min(surr1, surr2)
+            value_loss = F.smooth_l1_loss(v, td_target)
+            loss = policy_loss + value_loss
 
             self.optimizer.zero_grad()
             loss.mean().backward()
             self.optimizer.step()
+
+        self.export_weights()
+        # loss terms of the last epoch
+        return policy_loss.mean().item(), value_loss.item()
+
+
+def get_advantages(delta, done_mask):
+    """
+    Generalized advantage estimates of a (T, ...) array of TD errors along axis 0: a[t] = delta[t] + gamma * lmbda *
+    done_mask[t] * a[t + 1], i.e. a discounted cumulative sum restarted after every done step.
+    """
+    discount = gamma * lmbda
+    if (done_mask[:-1] != 0).all():
+        # no episode ends inside the batch: one reversed first order filter
+        advantage = lfilter([1.0], [1.0, -discount], delta[::-1], axis=0)[::-1]
+    else:
+        advantage = np.empty_like(delta)
+        next_advantage = np.zeros_like(delta[0])
+        for t in range(len(delta) - 1, -1, -1):
+            next_advantage = delta[t] + discount * done_mask[t] * next_advantage
+            advantage[t] = next_advantage
+    return np.ascontiguousarray(advantage, dtype=np.float32)
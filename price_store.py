@@ -0,0 +1,161 @@
+from collections.abc import MutableMapping
+from pathlib import Path
+import json
+import sys
+import numpy as np
+import pandas as pd
+
+
+price_store_file_name = 'prices.bin'
+price_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+_magic = b'RLPRICE1'
+_alignment = 64
+
+
+class PriceStore:
+    """
+    Read-only view of a price store file: all tickers' bars stacked into one int64 epoch-day date column and one
+    float32 column per price field, plus a ticker -> (offset, length) index into the stacked rows.
+
+    File layout: magic (8 bytes), header length (uint64), JSON header, then the columns, each 64 byte aligned.
+    The file is memory mapped on first access, so only the pages of tickers that are read are loaded.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(_magic)) != _magic:
+                raise ValueError(f'{self.path} is not a price store.')
+            header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_len).decode('utf-8'))
+
+        self.n_rows = header['n_rows']
+        self.index = {ticker: (offset, length) for ticker, (offset, length) in header['tickers'].items()}
+        self.column_offsets = header['column_offsets']
+        self._mmap = None
+        self._columns = None
+
+    @property
+    def tickers(self):
+        return list(self.index.keys())
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._mmap = np.memmap(self.path, dtype=np.uint8, mode='r')
+            self._columns = {}
+            for column, offset in self.column_offsets.items():
+                dtype = np.int64 if column == 'Date' else np.float32
+                size = self.n_rows * np.dtype(dtype).itemsize
+                self._columns[column] = self._mmap[offset:offset + size].view(dtype)
+        return self._columns
+
+    def get_arrays(self, ticker):
+        # zero-copy views of the ticker's rows, dates as epoch days
+        offset, length = self.index[ticker]
+        return {column: values[offset:offset + length] for column, values in self.columns.items()}
+
+    def get_df(self, ticker, rows=None):
+        # rows optionally selects rows of the ticker (boolean mask or slice) before the DataFrame is built
+        arrays = self.get_arrays(ticker)
+        rows = rows if rows is not None else slice(None)
+        dates = arrays['Date'][rows]
+        values = np.empty((len(dates), len(price_columns)), dtype=np.float64)
+        for j, column in enumerate(price_columns):
+            values[:, j] = arrays[column][rows]
+        index = pd.DatetimeIndex(dates.astype('datetime64[D]').astype('datetime64[ns]'), name='Date')
+        return pd.DataFrame(values, index=index, columns=price_columns)
+
+
+class LazyPriceDfs(MutableMapping):
+    """
+    dict-like ticker -> DataFrame over a PriceStore, building each DataFrame on first access. Assigning or
+    deleting tickers only affects this mapping, the store file is never modified.
+    """
+    def __init__(self, store, tickers):
+        self.store = store
+        self.tickers = dict.fromkeys(tickers)
+        self.dfs = {}
+
+    def __getitem__(self, ticker):
+        if ticker not in self.dfs:
+            if ticker not in self.store.index or ticker not in self.tickers:
+                raise KeyError(ticker)
+            self.dfs[ticker] = self.store.get_df(ticker)
+        return self.dfs[ticker]
+
+    def __setitem__(self, ticker, df):
+        self.tickers[ticker] = None
+        self.dfs[ticker] = df
+
+    def __delitem__(self, ticker):
+        del self.tickers[ticker]
+        self.dfs.pop(ticker, None)
+
+    def __iter__(self):
+        return iter(list(self.tickers))
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.tickers
+
+
+def build_price_store(base_data_path, store_path=None):
+    """
+    Converts the per ticker CSV files in base_data_path into a single price store file (by default
+    base_data_path/prices.bin). Prices and volumes are stored as float32.
+    """
+    base_data_path = Path(base_data_path)
+    store_path = Path(store_path) if store_path is not None else base_data_path.joinpath(price_store_file_name)
+
+    dates = []
+    columns = {column: [] for column in price_columns}
+    tickers = {}
+    n_rows = 0
+    for f in sorted(base_data_path.glob('*.csv')):
+        df = pd.read_csv(f, header=0, index_col='Date')
+        df.index = pd.to_datetime(df.index)
+
+        tickers[f.stem] = (n_rows, len(df))
+        n_rows += len(df)
+        dates.append(df.index.values.astype('datetime64[D]').astype(np.int64))
+        for column in price_columns:
+            columns[column].append(pd.to_numeric(df[column], errors='coerce').values.astype(np.float32))
+
+    arrays = {'Date': np.concatenate(dates) if dates else np.zeros(0, dtype=np.int64)}
+    for column in price_columns:
+        arrays[column] = np.concatenate(columns[column]) if columns[column] else np.zeros(0, dtype=np.float32)
+
+    # the header size depends on the column offsets, so grow the reserved header space until they fit
+    header_space = _alignment
+    while True:
+        column_offsets = {}
+        offset = _align(len(_magic) + 8 + header_space)
+        for column, values in arrays.items():
+            column_offsets[column] = offset
+            offset = _align(offset + values.nbytes)
+        header = json.dumps({'n_rows': n_rows, 'tickers': tickers, 'column_offsets': column_offsets}).encode('utf-8')
+        if len(header) <= header_space:
+            break
+        header_space = _align(len(header))
+
+    with open(store_path, 'wb') as f:
+        f.write(_magic)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for column, values in arrays.items():
+            f.write(b'\0' * (column_offsets[column] - f.tell()))
+            f.write(values.tobytes())
+
+    print(f'built price store {store_path} with {len(tickers)} tickers ({n_rows} data points).')
+    return store_path
+
+
+def _align(offset):
+    return (offset + _alignment - 1) // _alignment * _alignment
+
+
+if __name__ == '__main__':
+    build_price_store(base_data_path=sys.argv[1] if len(sys.argv) > 1 else './data/')
@@ -0,0 +1,196 @@
+import cProfile
+import gc
+import json
+import pstats
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+from account_management import AccountState
+from action_sampler import ActionSampler
+from ppo import PPO
+from rl_env import TradingEnv
+
+
+# phase -> (class, method) timed by Profiler.start. nested phases (account.* within env.step) are inclusive.
+default_phases = {
+    'env.reset': (TradingEnv, 'reset'),
+    'env.step': (TradingEnv, 'step'),
+    'account.trade': (AccountState, 'trade'),
+    'account.update': (AccountState, 'update'),
+    'ppo.pi': (PPO, 'pi_numpy'),
+    'sampler.sample': (ActionSampler, 'sample'),
+    'ppo.train_net': (PPO, 'train_net'),
+}
+
+
+class Profiler:
+    """
+    Times the phases of a training or testing run (see runs.train(..., profiler=...)). While started, the methods of
+    phases are replaced on their classes by wrappers that record the wall clock duration of every call, so nothing
+    is paid when no profiler is used. With track_allocations, the net number of allocated memory blocks per phase is
+    recorded too, at a cost of tens of microseconds per call. Only calls made in the calling process are seen: with
+    n_workers > 1, rollout and test episodes run in worker processes.
+
+    With cprofile_every=k, every k-th episode (counted by env resets) additionally runs under cProfile and the report
+    lists the functions with the most own time over those episodes. report gives steps/sec and per phase call counts,
+    total seconds and duration percentiles (of the last max_samples calls), and is written as JSON to report_path,
+    if given, when the run finishes.
+    """
+    def __init__(self, report_path=None, cprofile_every=None, track_allocations=False, phases=None,
+                 max_samples=100000):
+        self.report_path = Path(report_path) if report_path is not None else None
+        self.cprofile_every = cprofile_every
+        self.track_allocations = track_allocations
+        self.phases = dict(default_phases if phases is None else phases)
+        self.max_samples = max_samples
+        self.stats = {phase: _PhaseStats(max_samples) for phase in self.phases}
+        self.counters = {}
+        self.cprofile = cProfile.Profile() if cprofile_every else None
+        self.n_episodes = 0
+        self.n_cprofile_episodes = 0
+        self.cprofile_active = False
+        self.patches = []
+        self.start_time = None
+        self.seconds = 0.0
+        self.gc_collections = None
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def start(self):
+        for phase, (cls, method) in self.phases.items():
+            original = cls.__dict__[method]
+            wrapper = _timed(f=original,
+                             stats=self.stats[phase],
+                             on_call=self._on_episode if phase == 'env.reset' else None,
+                             track_allocations=self.track_allocations)
+            setattr(cls, method, wrapper)
+            self.patches.append((cls, method, original))
+        self.gc_collections = [s['collections'] for s in gc.get_stats()]
+        self.start_time = time.perf_counter()
+        return self
+
+    def stop(self):
+        if self.start_time is None:
+            return
+        self.seconds += time.perf_counter() - self.start_time
+        self.start_time = None
+        self._set_cprofile(False)
+        for cls, method, original in reversed(self.patches):
+            setattr(cls, method, original)
+        self.patches = []
+        self.gc_collections = [s['collections'] - n for s, n in zip(gc.get_stats(), self.gc_collections)]
+        if self.report_path is not None:
+            self.write_report(self.report_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def report(self, n_functions=30):
+        # steps counted by the run itself (e.g. collected by rollout workers), else the env.step calls seen here
+        n_steps = self.counters.get('steps', self.stats['env.step'].n if 'env.step' in self.stats else None)
+        report = {'seconds': self.seconds,
+                  'n_steps': n_steps,
+                  'steps_per_second': n_steps / self.seconds if n_steps is not None and self.seconds > 0 else None,
+                  'n_episodes': self.n_episodes,
+                  'phases': {phase: stats.summary(seconds=self.seconds, track_allocations=self.track_allocations)
+                             for phase, stats in self.stats.items()},
+                  'counters': dict(self.counters),
+                  'gc_collections': self.gc_collections}
+        if self.cprofile is not None:
+            report['cprofile'] = {'n_episodes': self.n_cprofile_episodes,
+                                  'functions': _top_functions(self.cprofile, n_functions)}
+        return report
+
+    def write_report(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def _on_episode(self):
+        self.n_episodes += 1
+        if self.cprofile is not None:
+            sampled = (self.n_episodes - 1) % self.cprofile_every == 0
+            self.n_cprofile_episodes += sampled
+            self._set_cprofile(sampled)
+
+    def _set_cprofile(self, enabled):
+        if self.cprofile is None or enabled == self.cprofile_active:
+            return
+        if enabled:
+            self.cprofile.enable()
+        else:
+            self.cprofile.disable()
+        self.cprofile_active = enabled
+
+
+class _PhaseStats:
+    # call count, total duration (ns) and net allocated blocks, with a ring of the last max_samples durations
+    __slots__ = ('n', 'total_ns', 'blocks', 'samples', 'max_samples')
+
+    def __init__(self, max_samples):
+        self.n = 0
+        self.total_ns = 0
+        self.blocks = 0
+        self.samples = []
+        self.max_samples = max_samples
+
+    def add(self, ns, blocks):
+        if self.n < self.max_samples:
+            self.samples.append(ns)
+        else:
+            self.samples[self.n % self.max_samples] = ns
+        self.n += 1
+        self.total_ns += ns
+        self.blocks += blocks
+
+    def summary(self, seconds, track_allocations):
+        samples = np.array(self.samples, dtype=np.float64) / 1000
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99]) if len(samples) else (None, None, None)
+        return {'n_calls': self.n,
+                'seconds': self.total_ns / 1e9,
+                'share': self.total_ns / 1e9 / seconds if seconds > 0 else None,
+                'p50_us': p50,
+                'p90_us': p90,
+                'p99_us': p99,
+                'max_us': float(samples.max()) if len(samples) else None,
+                'net_allocated_blocks': self.blocks if track_allocations else None}
+
+
+def _timed(f, stats, on_call=None, track_allocations=False):
+    perf_counter_ns = time.perf_counter_ns
+    # sys.getallocatedblocks walks the allocator's arenas, so it is only called when asked for
+    getallocatedblocks = sys.getallocatedblocks if track_allocations else int
+
+    def timed(*args, **kwargs):
+        if on_call is not None:
+            on_call()
+        blocks = getallocatedblocks()
+        start = perf_counter_ns()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            stats.add(perf_counter_ns() - start, getallocatedblocks() - blocks)
+
+    timed.__wrapped__ = f
+    return timed
+
+
+def _top_functions(profile, n):
+    if not profile.getstats():
+        return []
+    stats = pstats.Stats(profile)
+    rows = []
+    for (file_name, line, name), (_, n_calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({'function': f'{Path(file_name).name}:{line}({name})',
+                     'n_calls': n_calls,
+                     'tottime': tottime,
+                     'cumtime': cumtime})
+    rows.sort(key=lambda row: row['tottime'], reverse=True)
+    return rows[:n]
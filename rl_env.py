@@ -1,66 +1,163 @@
 import numpy as np
+import pandas as pd
 
-from features import (attach_empty_training_cols, set_pre_action_cols, set_post_action_cols, get_state_for_policy,
-                      attach_features)
+from feature_store import FeatureStore
 from account_management import AccountState
 
 
+ledger_cols = ['pre_fixed', 'pre_floating', 'pre_total', 'pre_alloc', 'pre_units', 'policy_alloc',
+               'post_fixed', 'post_floating', 'post_total', 'post_alloc', 'post_units', 'reward']
+(PRE_FIXED, PRE_FLOATING, PRE_TOTAL, PRE_ALLOC, PRE_UNITS, POLICY_ALLOC,
+ POST_FIXED, POST_FLOATING, POST_TOTAL, POST_ALLOC, POST_UNITS, REWARD) = range(len(ledger_cols))
+
+
 class TradingEnv:
-    def __init__(self, dfs, starting_acc_balance, features, allocations, n_start_point_to_ignore):
+    def __init__(self, dfs, starting_acc_balance, features, allocations, n_start_point_to_ignore,
+                 feature_store=None, rng=None, dataset=None):
+        if dataset is not None and list(dataset.features) != list(features):
+            raise ValueError(f'dataset features {dataset.features} do not match {features}.')
         self.dfs = dfs
+        self.dataset = dataset
+        self.tickers = list(dataset.tickers if dataset is not None else dfs.keys())
+        self.feature_store = feature_store if feature_store is not None else FeatureStore()
+        self.rng = rng if rng is not None else np.random
         self.starting_acc_balance = starting_acc_balance
-        self.curr_df = None
+        self.curr_ticker = None
+        self.curr_states = None
+        self.curr_close = None
         self.curr_dates = None
         self.curr_date_idx = None
+        self.curr_ledger = None
+        self.pre_account = None
         self.features = features
         self.actions_to_alloc = {i: allocations[i] for i in range(len(allocations))}
         self.n_start_point_to_ignore = n_start_point_to_ignore
 
-    def reset(self):
-        ticker = np.random.choice(list(self.dfs.keys()))
-        self.curr_df = self.dfs[ticker].copy()
-        attach_features(df=self.curr_df)
-        # print(self.curr_df.head(50))
-        self.curr_df = self.curr_df.iloc[self.n_start_point_to_ignore:].copy()
-
-        # print(f'\n######## reset: {ticker}, {self.curr_df.index.date[0]} to {self.curr_df.index.date[-1]}, {len(self.curr_df)}')
-
-        # print((self.curr_df.isnull().any()) | ((self.curr_df == 'NaN').any()))
+    def reset(self, ticker=None):
+        if ticker is None:
+            ticker = self.rng.choice(self.tickers)
+        if self.dataset is not None:
+            frame = self.dataset.get(ticker)
+        else:
+            frame = self.feature_store.get(ticker=ticker, df=self.dfs[ticker], features=self.features)
 
-        attach_empty_training_cols(df=self.curr_df)
-        self.curr_dates = self.curr_df.index.date
+        self.curr_ticker = ticker
+        self.curr_states = frame.values[self.n_start_point_to_ignore:]
+        self.curr_close = frame.close[self.n_start_point_to_ignore:]
+        self.curr_dates = frame.dates[self.n_start_point_to_ignore:]
+        self.curr_ledger = np.full((len(self.curr_close), len(ledger_cols)), np.nan)
         self.curr_date_idx = 0
 
-        day = self.curr_dates[0]
-        pre_account = AccountState(fixed=self.starting_acc_balance, market_price=self.curr_df.at[day, 'Close'])
-        set_pre_action_cols(df=self.curr_df, day=day, pre_account=pre_account)
-        state = get_state_for_policy(df=self.curr_df, day=day, features=self.features)
+        self.pre_account = AccountState(fixed=self.starting_acc_balance, market_price=self.curr_close[0])
+        self._set_pre_action_cols(idx=0, pre_account=self.pre_account)
+        state = self.curr_states[0].copy()
         return state
 
     def step(self, action):
-        day = self.curr_dates[self.curr_date_idx]
+        idx = self.curr_date_idx
 
         target_alloc = self.actions_to_alloc[action]
-        units = self.curr_df.at[day, 'pre_account'].get_units_to_trade(target_alloc=target_alloc)
-        post_account = self.curr_df.at[day, 'pre_account'].trade(units=units)
-        set_post_action_cols(df=self.curr_df, day=day, post_account=post_account, target_alloc=target_alloc)
+        units = self.pre_account.get_units_to_trade(target_alloc=target_alloc)
+        post_account = self.pre_account.trade(units=units)
+        self._set_post_action_cols(idx=idx, post_account=post_account, target_alloc=target_alloc)
 
         self.curr_date_idx += 1
 
-        next_day = self.curr_dates[self.curr_date_idx]
-        pre_account = self.curr_df.at[day, 'post_account'].update(market_price=self.curr_df.at[next_day, 'Close'])
-        set_pre_action_cols(df=self.curr_df, day=next_day, pre_account=pre_account)
+        self.pre_account = post_account.update(market_price=self.curr_close[idx + 1])
+        self._set_pre_action_cols(idx=idx + 1, pre_account=self.pre_account)
 
-        day_total = self.curr_df.at[day, 'post_total']
-        next_day_total = self.curr_df.at[next_day, 'pre_total']
+        day_total = self.curr_ledger[idx, POST_TOTAL]
+        next_day_total = self.curr_ledger[idx + 1, PRE_TOTAL]
         reward = (next_day_total - day_total) / day_total
-        self.curr_df.at[day, 'reward'] = reward
+        self.curr_ledger[idx, REWARD] = reward
 
-        state = get_state_for_policy(df=self.curr_df, day=day, features=self.features)
         done = False
-        if self.curr_date_idx >= len(self.curr_dates) - 1 or post_account.total() < self.curr_df.at[day, 'Close']:
+        if self.curr_date_idx >= len(self.curr_close) - 1 or post_account.total() < self.curr_close[idx]:
             done = True
+            state = self.curr_states[idx].copy()
         else:
-            state = get_state_for_policy(df=self.curr_df, day=next_day, features=self.features)
+            state = self.curr_states[idx + 1].copy()
 
         return state, reward, done
+
+    def get_episode_df(self):
+        n = self.curr_date_idx + 1
+        df = pd.DataFrame(self.curr_ledger[:n], columns=ledger_cols,
+                          index=pd.DatetimeIndex(self.curr_dates[:n], name='Date'))
+        df.insert(0, 'Close', self.curr_close[:n])
+        df[self.features] = self.curr_states[:n]
+        return df
+
+    def _set_pre_action_cols(self, idx, pre_account):
+        row = self.curr_ledger[idx]
+        row[PRE_FIXED] = pre_account.fixed
+        row[PRE_FLOATING] = pre_account.floating
+        row[PRE_TOTAL] = pre_account.total()
+        row[PRE_ALLOC] = pre_account.alloc()
+        row[PRE_UNITS] = pre_account.units
+
+    def _set_post_action_cols(self, idx, post_account, target_alloc):
+        row = self.curr_ledger[idx]
+        row[POLICY_ALLOC] = target_alloc
+        row[POST_FIXED] = post_account.fixed
+        row[POST_FLOATING] = post_account.floating
+        row[POST_TOTAL] = post_account.total()
+        row[POST_ALLOC] = post_account.alloc()
+        row[POST_UNITS] = post_account.units
+
+
+class VecTradingEnv:
+    """
+    Runs n_envs TradingEnv instances in lockstep over a shared FeatureStore (or SharedDataset). step takes one action
+    per slot and returns (n_envs, n_features) states and (n_envs,) rewards and dones. Slots whose episode is done are
+    reset automatically, so the returned state of such a slot is the first state of its next episode (the terminal
+    state is kept in next_states). Once max_episodes episodes have been started, finished slots are deactivated instead.
+    """
+    def __init__(self, dfs, n_envs, starting_acc_balance, features, allocations, n_start_point_to_ignore,
+                 max_episodes=None, feature_store=None, dataset=None):
+        feature_store = feature_store if feature_store is not None else FeatureStore()
+        self.envs = [TradingEnv(dfs=dfs,
+                                starting_acc_balance=starting_acc_balance,
+                                features=features,
+                                allocations=allocations,
+                                n_start_point_to_ignore=n_start_point_to_ignore,
+                                feature_store=feature_store,
+                                dataset=dataset)
+                     for _ in range(n_envs)]
+        self.n_envs = n_envs
+        self.max_episodes = max_episodes
+        self.n_episodes_started = 0
+        self.states = np.zeros((n_envs, len(features)), dtype=np.float32)
+        self.next_states = np.zeros((n_envs, len(features)), dtype=np.float32)
+        self.rewards = np.zeros(n_envs)
+        self.dones = np.zeros(n_envs, dtype=bool)
+        self.active = np.zeros(n_envs, dtype=bool)
+
+    def reset(self):
+        self.n_episodes_started = 0
+        self.active[:] = False
+        for i in range(self.n_envs):
+            self._reset_slot(i)
+        return self.states.copy()
+
+    def step(self, actions):
+        self.rewards[:] = 0.0
+        self.dones[:] = True
+        for i in np.flatnonzero(self.active):
+            state, reward, done = self.envs[i].step(actions[i])
+            self.next_states[i] = state
+            self.rewards[i] = reward
+            self.dones[i] = done
+            if done:
+                self._reset_slot(i)
+            else:
+                self.states[i] = state
+        return self.states.copy(), self.rewards.copy(), self.dones.copy()
+
+    def _reset_slot(self, i):
+        if self.max_episodes is not None and self.n_episodes_started >= self.max_episodes:
+            self.active[i] = False
+            return
+        self.states[i] = self.envs[i].reset()
+        self.active[i] = True
+        self.n_episodes_started += 1
@@ -0,0 +1,73 @@
+import numpy as np
+import torch
+
+
+class RolloutBuffer:
+    """
+    Fixed capacity storage of transitions for n_envs environments in the (T, N) layout: row t of env i holds the
+    t-th transition written for that env. The arrays are preallocated float32 (actions int64) numpy arrays shared
+    with the torch tensors handed out by get, so writing a step is a few indexed assignments and the learner reads
+    the transitions without a copy. A growable buffer doubles its capacity when full (views handed out before keep
+    the old arrays), otherwise add raises IndexError.
+    """
+    def __init__(self, capacity, dim_state, n_envs=1, growable=False):
+        self.capacity = capacity
+        self.growable = growable
+        self.n_envs = n_envs
+        self.s = np.zeros((capacity, n_envs, dim_state), dtype=np.float32)
+        self.a = np.zeros((capacity, n_envs, 1), dtype=np.int64)
+        self.r = np.zeros((capacity, n_envs, 1), dtype=np.float32)
+        self.s_prime = np.zeros((capacity, n_envs, dim_state), dtype=np.float32)
+        self.done_mask = np.zeros((capacity, n_envs, 1), dtype=np.float32)
+        self.log_prob_a = np.zeros((capacity, n_envs, 1), dtype=np.float32)
+        self.tensors = self._tensors()
+        # number of transitions written per env
+        self.n = np.zeros(n_envs, dtype=np.int64)
+
+    def add(self, s, a, r, s_prime, log_prob_a, done, envs=0):
+        """
+        Appends one transition to each env in envs (an index or an array of distinct indices, with one row of s, a,
+        ... per env).
+        """
+        rows = self.n[envs]
+        if np.any(rows >= self.capacity):
+            if not self.growable:
+                raise IndexError(f'rollout buffer of capacity {self.capacity} is full.')
+            self._grow(2 * self.capacity)
+        self.s[rows, envs] = s
+        self.a[rows, envs, 0] = a
+        self.r[rows, envs, 0] = r
+        self.s_prime[rows, envs] = s_prime
+        self.done_mask[rows, envs, 0] = np.logical_not(done)
+        self.log_prob_a[rows, envs, 0] = log_prob_a
+        self.n[envs] += 1
+
+    def get(self, env=None):
+        """
+        Returns (s, a, r, s_prime, done_mask, log_prob_a) views as expected by PPO.train_net: (n, ...) for the
+        transitions of env, or (n, N, ...) for all envs if env is None (all envs must hold n transitions then).
+        """
+        if env is None:
+            n = self.n[0]
+            if (self.n != n).any():
+                raise ValueError('envs hold different numbers of transitions.')
+            return tuple(x[:n] for x in self.tensors)
+        return tuple(x[:self.n[env], env] for x in self.tensors)
+
+    def clear(self, env=None):
+        if env is None:
+            self.n[:] = 0
+        else:
+            self.n[env] = 0
+
+    def _grow(self, capacity):
+        for name in ('s', 'a', 'r', 's_prime', 'done_mask', 'log_prob_a'):
+            x = getattr(self, name)
+            grown = np.zeros((capacity,) + x.shape[1:], dtype=x.dtype)
+            grown[:self.capacity] = x
+            setattr(self, name, grown)
+        self.capacity = capacity
+        self.tensors = self._tensors()
+
+    def _tensors(self):
+        return [torch.from_numpy(x) for x in (self.s, self.a, self.r, self.s_prime, self.done_mask, self.log_prob_a)]
@@ -0,0 +1,173 @@
+import queue
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from rl_env import TradingEnv
+from shared_dataset import SharedDataset
+from ppo import PPO
+from action_sampler import ActionSampler
+from account_management import invariant_checks
+
+
+class RolloutWorkers:
+    """
+    Collects PPO trajectories in n_workers processes, each owning a TradingEnv over a shard of the tickers. The
+    feature frames are computed once into a SharedDataset that all workers map read-only (or taken from the given
+    dataset).
+
+    Workers act with a snapshot of the policy weights held in a shared vector, refreshed whenever the learner
+    publishes new weights. Trajectory chunks of up to horizon transitions are written into two shared memory slots
+    per worker (so a worker can fill one while the learner reads the other) and announced over a queue.
+    """
+    def __init__(self, model, dfs, n_workers, horizon, env_kwargs, seed=0, dataset=None):
+        self.n_workers = n_workers
+        self.dim_state = model.fc1.in_features
+        self.dim_actions = model.fc_pi.out_features
+        # row layout: s, a, r, s_prime, log_prob_a, done
+        self.width = 2 * self.dim_state + 4
+
+        ctx = mp.get_context()
+        self.weights = parameters_to_vector(model.parameters()).detach().clone().share_memory_()
+        self.weights_version = ctx.Value('l', 0)
+        self.weights_lock = ctx.Lock()
+        self.buffers = torch.zeros((n_workers, 2, horizon, self.width), dtype=torch.float32).share_memory_()
+        self.free_slots = [ctx.Semaphore(2) for _ in range(n_workers)]
+        self.results = ctx.Queue()
+        self.stop = ctx.Event()
+
+        self.owns_dataset = dataset is None
+        if dataset is None:
+            dataset = SharedDataset.create(dfs=dfs, features=env_kwargs['features'])
+        self.dataset = dataset
+        tickers = self.dataset.tickers
+        if n_workers > len(tickers):
+            self._close_dataset()
+            raise ValueError(f'n_workers ({n_workers}) exceeds the number of tickers ({len(tickers)}).')
+        self.processes = []
+        for i in range(n_workers):
+            shard = self.dataset.subset(tickers[i::n_workers])
+            p = ctx.Process(target=_run_worker,
+                            args=(i, shard, env_kwargs, horizon, self.dim_state, self.dim_actions, self.weights,
+                                  self.weights_version, self.weights_lock, self.buffers[i], self.free_slots[i],
+                                  self.results, self.stop, seed + i),
+                            daemon=True)
+            self.processes.append(p)
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+
+    def get(self):
+        """
+        Waits for the next trajectory chunk and returns (worker_id, batch, episode), where batch is (s, a, r, s_prime,
+        done_mask, log_prob_a) as expected by PPO.train_net and episode is (mean, std, n_points) of the daily %
+        returns and the wall clock seconds of the episode in its worker if the chunk ends an episode, else None.
+        Raises RuntimeError once a worker has failed.
+        """
+        while True:
+            self._check_workers()
+            try:
+                worker_id, slot, n, episode = self.results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not any(p.is_alive() for p in self.processes):
+                    raise RuntimeError('all rollout workers exited')
+
+        # one copy of the chunk frees the slot, the batch holds column views of it
+        rows = self.buffers[worker_id, slot, :n].clone()
+        self.free_slots[worker_id].release()
+
+        d = self.dim_state
+        batch = (rows[:, :d], rows[:, d:d + 1].long(), rows[:, d + 1:d + 2], rows[:, d + 2:2 * d + 2],
+                 1 - rows[:, 2 * d + 3:], rows[:, 2 * d + 2:2 * d + 3])
+        return worker_id, batch, episode
+
+    def _check_workers(self):
+        # a crashed worker would otherwise go unnoticed while the others keep delivering chunks
+        for i, p in enumerate(self.processes):
+            if p.exitcode not in (None, 0):
+                raise RuntimeError(f'rollout worker {i} exited with code {p.exitcode}')
+
+    def publish(self, model):
+        with self.weights_lock:
+            self.weights.copy_(parameters_to_vector(model.parameters()).detach())
+            self.weights_version.value += 1
+
+    def close(self):
+        self.stop.set()
+        for free_slots in self.free_slots:
+            free_slots.release()
+        for p in self.processes:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+        self.results.close()
+        self._close_dataset()
+
+    def _close_dataset(self):
+        if self.owns_dataset:
+            self.dataset.close()
+
+
+def _run_worker(worker_id, dataset, env_kwargs, horizon, dim_state, dim_actions, weights, weights_version, weights_lock,
+                buffers, free_slots, results, stop, seed):
+    torch.set_num_threads(1)
+    results.cancel_join_thread()
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    env = TradingEnv(dfs=None, dataset=dataset, **env_kwargs)
+    model = PPO(dim_state=dim_state, dim_actions=dim_actions)
+    sampler = ActionSampler(seed=seed)
+    version = -1
+    slot = 0
+    d = dim_state
+
+    with invariant_checks(False), torch.no_grad():
+        s = env.reset()
+        episode_start = time.perf_counter()
+        daily_perc_returns = []
+        while not stop.is_set():
+            if not free_slots.acquire(timeout=0.1):
+                continue
+            if stop.is_set():
+                break
+
+            if version != weights_version.value:
+                with weights_lock:
+                    vector_to_parameters(weights, model.parameters())
+                    version = weights_version.value
+                model.export_weights()
+
+            rows = buffers[slot].numpy()
+            n = 0
+            done = False
+            while n < horizon and not done:
+                a, log_prob_a = sampler.sample(model.pi_numpy(s))
+                s_prime, r, done = env.step(int(a))
+
+                row = rows[n]
+                row[:d] = s
+                row[d] = a
+                row[d + 1] = r
+                row[d + 2:2 * d + 2] = s_prime
+                row[2 * d + 2] = log_prob_a
+                row[2 * d + 3] = done
+                n += 1
+
+                daily_perc_returns.append(r * 100)
+                s = s_prime
+
+            episode = None
+            if done:
+                episode = (float(np.mean(daily_perc_returns)), float(np.std(daily_perc_returns)),
+                           len(daily_perc_returns), time.perf_counter() - episode_start)
+                daily_perc_returns = []
+                s = env.reset()
+                episode_start = time.perf_counter()
+
+            results.put((worker_id, slot, n, episode))
+            slot ^= 1
@@ -1,129 +1,243 @@
+from contextlib import nullcontext
+import time
 import pandas as pd
 import torch
-from torch.distributions import Categorical
 import numpy as np
-from rl_env import TradingEnv
+from rl_env import VecTradingEnv
 from ppo import PPO
+from action_sampler import ActionSampler
+from rollout_buffer import RolloutBuffer
+from rollout_workers import RolloutWorkers
+from evaluation import evaluate_policy, evaluate_baseline
+from account_management import invariant_checks
+from metrics_log import MetricsLog
 
 
 K_epoch = 3
 T_horizon = 100
+n_train_episodes = 599
+n_test_episodes = 1000
 starting_acc_balance = 10000.0
 
 
-def train(allocations, features, model_path, dfs, n_start_point_to_ignore):
-    env = TradingEnv(dfs=dfs,
-                     starting_acc_balance=starting_acc_balance,
-                     features=features,
-                     allocations=allocations,
-                     n_start_point_to_ignore=n_start_point_to_ignore)
+def train(allocations, features, model_path, dfs, n_start_point_to_ignore, n_envs=1, n_workers=1, dataset=None,
+          profiler=None, metrics_path=None):
+    if n_workers > 1:
+        return _train_with_workers(allocations=allocations,
+                                   features=features,
+                                   model_path=model_path,
+                                   dfs=dfs,
+                                   n_start_point_to_ignore=n_start_point_to_ignore,
+                                   n_workers=n_workers,
+                                   dataset=dataset,
+                                   profiler=profiler,
+                                   metrics_path=metrics_path)
+
+    env = VecTradingEnv(dfs=dfs,
+                        n_envs=n_envs,
+                        starting_acc_balance=starting_acc_balance,
+                        features=features,
+                        allocations=allocations,
+                        n_start_point_to_ignore=n_start_point_to_ignore,
+                        max_episodes=n_train_episodes,
+                        dataset=dataset)
     model = PPO(dim_state=len(features), dim_actions=len(allocations))
+    # seeded from numpy's global generator, so np.random.seed makes training reproducible
+    sampler = ActionSampler(seed=np.random.randint(2 ** 31))
     print_interval = 1
 
-    for n_epi in range(1, 600):
-        daily_perc_returns = []
+    with invariant_checks(False), _profiling(profiler), _metrics_log(metrics_path) as metrics_log:
+        n_epi = 0
+        total_steps = 0
+        buffer = RolloutBuffer(capacity=T_horizon, dim_state=len(features), n_envs=n_envs)
+        daily_perc_returns = [[] for _ in range(n_envs)]
+        episodes = [_EpisodeMetrics() for _ in range(n_envs)]
         s = env.reset()
-        done = False
-        while not done:
-            for t in range(T_horizon):
-                prob = model.pi(torch.from_numpy(s).float())
-                m = Categorical(prob)
-                try:
-                    a = m.sample().item()
-                except RuntimeError:
-                    print(prob)
-                    print(m)
-
-                s_prime, r, done = env.step(a)
-                model.put_data((s, a, r, s_prime, prob[a].item(), done))
-                s = s_prime
-
-                daily_perc_returns.append(r * 100)
-
-                if done:
-                    break
-            model.train_net()
-
-        if n_epi % print_interval == 0 and n_epi != 0:
-            print("mean: {:.3f}%, std: {:.3f}%, episode: {}, npoints: {}".format(np.mean(daily_perc_returns),
-                                                                                 np.std(daily_perc_returns),
-                                                                                 n_epi,
-                                                                                 len(daily_perc_returns)))
-            daily_perc_returns = []
+        while env.active.any():
+            active = np.flatnonzero(env.active)
+            a, log_prob_a = sampler.sample(model.pi_numpy(s))
+
+            s_prime, r, done = env.step(a)
+            if profiler is not None:
+                profiler.count('steps', len(active))
+            buffer.add(s=s[active], a=a[active], r=r[active], s_prime=env.next_states[active],
+                       log_prob_a=log_prob_a[active], done=done[active], envs=active)
+            for i in active:
+                daily_perc_returns[i].append(r[i] * 100)
+
+                # each slot is trained on its own trajectory every T_horizon steps and at the end of its episode
+                if done[i] or buffer.n[i] == T_horizon:
+                    start = time.perf_counter()
+                    losses = model.train_net(batch=buffer.get(i))
+                    episodes[i].add_update(losses=losses, seconds=time.perf_counter() - start)
+                    buffer.clear(i)
+
+                if done[i]:
+                    episode = _episode_stats(daily_perc_returns[i])
+                    if episode is not None:
+                        n_epi += 1
+                        mean, std, n_points = episode
+                        total_steps += n_points
+                        if n_epi % print_interval == 0:
+                            _print_episode(mean=mean, std=std, n_epi=n_epi, n_points=n_points)
+                        if metrics_log is not None:
+                            episodes[i].log(metrics_log=metrics_log, n_epi=n_epi, mean=mean, std=std,
+                                            n_points=n_points, total_steps=total_steps)
+                    episodes[i] = _EpisodeMetrics()
+                    daily_perc_returns[i] = []
+            s = s_prime
 
     torch.save(model.state_dict(), model_path)
 
 
-def test(allocations, features, model_path, dfs, results_path, n_start_point_to_ignore):
-    env = TradingEnv(dfs=dfs,
-                     starting_acc_balance=starting_acc_balance,
-                     features=features,
-                     allocations=allocations,
-                     n_start_point_to_ignore=n_start_point_to_ignore)
+def _train_with_workers(allocations, features, model_path, dfs, n_start_point_to_ignore, n_workers, dataset, profiler,
+                        metrics_path):
     model = PPO(dim_state=len(features), dim_actions=len(allocations))
-    model.load_state_dict(torch.load(model_path))
-    model.eval()
+    workers = RolloutWorkers(model=model,
+                             dfs=dfs,
+                             n_workers=n_workers,
+                             horizon=T_horizon,
+                             env_kwargs={'starting_acc_balance': starting_acc_balance,
+                                         'features': features,
+                                         'allocations': allocations,
+                                         'n_start_point_to_ignore': n_start_point_to_ignore},
+                             dataset=dataset)
+    print_interval = 1
+
+    workers.start()
+    try:
+        with _profiling(profiler), _metrics_log(metrics_path) as metrics_log:
+            n_epi = 0
+            total_steps = 0
+            episodes = [_EpisodeMetrics() for _ in range(n_workers)]
+            while n_epi < n_train_episodes:
+                worker_id, batch, episode = workers.get()
+                start = time.perf_counter()
+                losses = model.train_net(batch=batch)
+                episodes[worker_id].add_update(losses=losses, seconds=time.perf_counter() - start)
+                if profiler is not None:
+                    profiler.count('steps', len(batch[0]))
+                workers.publish(model)
+
+                if episode is not None:
+                    # the episode's duration is measured by its worker, which runs ahead of the learner
+                    mean, std, n_points, episode_seconds = episode
+                    # an episode without steps has no returns, see _episode_stats
+                    if n_points > 0:
+                        n_epi += 1
+                        total_steps += n_points
+                        if n_epi % print_interval == 0:
+                            _print_episode(mean=mean, std=std, n_epi=n_epi, n_points=n_points)
+                        if metrics_log is not None:
+                            episodes[worker_id].log(metrics_log=metrics_log, n_epi=n_epi, mean=mean, std=std,
+                                                    n_points=n_points, total_steps=total_steps,
+                                                    episode_seconds=episode_seconds)
+                    episodes[worker_id] = _EpisodeMetrics()
+    finally:
+        workers.close()
+
+    torch.save(model.state_dict(), model_path)
+
 
+def test(allocations, features, model_path, dfs, results_path, n_start_point_to_ignore, n_workers=1, seed=0,
+         dataset=None, greedy=False, profiler=None):
     print_interval = 1
     all_daily_perc_returns = []
 
-    for n_epi in range(1, 1001):
-        daily_perc_returns = []
-        s = env.reset()
-        done = False
-        while not done:
-            for t in range(T_horizon):
-                prob = model.pi(torch.from_numpy(s).float())
-                m = Categorical(prob)
-                try:
-                    a = m.sample().item()
-                except RuntimeError:
-                    print(prob)
-                    print(m)
-
-                s_prime, r, done = env.step(a)
-                s = s_prime
-
-                daily_perc_returns.append(r * 100)
-                all_daily_perc_returns.append(r * 100)
-
-                if done:
-                    break
-
-        if n_epi % print_interval == 0 and n_epi != 0:
-            print("mean: {:.3f}%, std: {:.3f}%, episode: {}, npoints: {}".format(np.mean(daily_perc_returns),
-                                                                                 np.std(daily_perc_returns),
-                                                                                 n_epi,
-                                                                                 len(daily_perc_returns)))
-            daily_perc_returns = []
+    with _profiling(profiler):
+        episodes = evaluate_policy(state_dict=torch.load(model_path),
+                                   dfs=dfs,
+                                   features=features,
+                                   allocations=allocations,
+                                   starting_acc_balance=starting_acc_balance,
+                                   n_start_point_to_ignore=n_start_point_to_ignore,
+                                   n_episodes=n_test_episodes,
+                                   seed=seed,
+                                   n_workers=n_workers,
+                                   dataset=dataset,
+                                   greedy=greedy)
+        for n_epi, (_, daily_perc_returns) in enumerate(episodes, start=1):
+            all_daily_perc_returns.extend(daily_perc_returns)
+            if n_epi % print_interval == 0:
+                _print_episode(mean=np.mean(daily_perc_returns),
+                               std=np.std(daily_perc_returns),
+                               n_epi=n_epi,
+                               n_points=len(daily_perc_returns))
 
     df = pd.DataFrame({'data': all_daily_perc_returns})
     df.to_csv(results_path, header=False)
+    return all_daily_perc_returns
 
 
-def test_baseline(allocation, dfs, results_path, n_start_point_to_ignore):
-    all_daily_perc_returns = []
+def _profiling(profiler):
+    # profiler.start/stop around a run, if profiling was asked for
+    return profiler if profiler is not None else nullcontext()
+
+
+def _episode_stats(daily_perc_returns):
+    # (mean, std, n_points) of an episode's returns, None for an episode without steps: its NaN mean and std are
+    # neither printed nor logged, and it does not count towards the training episodes
+    if len(daily_perc_returns) == 0:
+        return None
+    return np.mean(daily_perc_returns), np.std(daily_perc_returns), len(daily_perc_returns)
+
 
-    counter = 0
-    for k, v in dfs.items():
-        counter += 1
-        print(f'{counter}/{len(dfs)} dfs completed.')
-
-        df = {k: v}
-        env = TradingEnv(dfs=df,
-                         starting_acc_balance=starting_acc_balance,
-                         features=['trix'],
-                         allocations=[allocation],
-                         n_start_point_to_ignore=n_start_point_to_ignore)
-        env.reset()
-        done = False
-        while not done:
-            for t in range(T_horizon):
-                s_prime, r, done = env.step(0)
-                all_daily_perc_returns.append(r * 100)
-
-                if done:
-                    break
+def _metrics_log(metrics_path):
+    return MetricsLog(metrics_path) if metrics_path is not None else nullcontext()
+
+
+class _EpisodeMetrics:
+    # loss and timing sums of the train_net updates made during one episode
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.policy_loss = 0.0
+        self.value_loss = 0.0
+        self.n_updates = 0
+        self.train_seconds = 0.0
+
+    def add_update(self, losses, seconds):
+        policy_loss, value_loss = losses
+        self.policy_loss += policy_loss
+        self.value_loss += value_loss
+        self.n_updates += 1
+        self.train_seconds += seconds
+
+    def log(self, metrics_log, n_epi, mean, std, n_points, total_steps, episode_seconds=None):
+        # episode_seconds defaults to the time since this episode's metrics were started
+        if episode_seconds is None:
+            episode_seconds = time.perf_counter() - self.start
+        n_updates = max(self.n_updates, 1)
+        metrics_log.append(episode=n_epi,
+                           steps=n_points,
+                           total_steps=total_steps,
+                           mean=mean,
+                           std=std,
+                           policy_loss=self.policy_loss / n_updates,
+                           value_loss=self.value_loss / n_updates,
+                           n_updates=self.n_updates,
+                           episode_seconds=episode_seconds,
+                           train_seconds=self.train_seconds,
+                           time=time.time())
+
+
+def _print_episode(mean, std, n_epi, n_points):
+    print("mean: {:.3f}%, std: {:.3f}%, episode: {}, npoints: {}".format(mean, std, n_epi, n_points))
+
+
+def test_baseline(allocation, dfs, results_path, n_start_point_to_ignore, n_workers=1, dataset=None):
+    all_daily_perc_returns = []
+    n_dfs = len(dataset.tickers) if dataset is not None else len(dfs)
+
+    episodes = evaluate_baseline(allocation=allocation,
+                                 dfs=dfs,
+                                 starting_acc_balance=starting_acc_balance,
+                                 n_start_point_to_ignore=n_start_point_to_ignore,
+                                 n_workers=n_workers,
+                                 dataset=dataset)
+    for counter, (_, daily_perc_returns) in enumerate(episodes, start=1):
+        all_daily_perc_returns.extend(daily_perc_returns)
+        print(f'{counter}/{n_dfs} dfs completed.')
 
     df = pd.DataFrame({'data': all_daily_perc_returns})
     df.to_csv(results_path, header=False)
+    return all_daily_perc_returns
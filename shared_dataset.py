@@ -0,0 +1,113 @@
+from pathlib import Path
+import json
+import shutil
+import tempfile
+import numpy as np
+
+from feature_store import FeatureStore, FeatureFrame
+
+
+class SharedDataset:
+    """
+    Read-only dates, close prices and feature matrices of many tickers, stacked into np.memmap files in one
+    directory with a ticker -> (offset, length) index. Pickling a SharedDataset only transfers the directory and the
+    index, so TradingEnv instances in other processes attach to the same pages instead of receiving copies of the
+    DataFrames. get returns the same FeatureFrame views as FeatureStore.get.
+    """
+    def __init__(self, path, features, index, n_rows, owner=False):
+        self.path = Path(path)
+        self.features = list(features)
+        self.index = index
+        self.n_rows = n_rows
+        self.owner = owner
+        self._arrays = None
+
+    @classmethod
+    def create(cls, dfs, features, path=None):
+        path = Path(path) if path is not None else Path(tempfile.mkdtemp(prefix='rl_trading_dataset_'))
+        path.mkdir(parents=True, exist_ok=True)
+
+        feature_store = FeatureStore(max_entries=1)
+        frames = {}
+        index = {}
+        n_rows = 0
+        for ticker in dfs.keys():
+            frames[ticker] = feature_store.get(ticker=ticker, df=dfs[ticker], features=features)
+            index[ticker] = (n_rows, len(frames[ticker].close))
+            n_rows += len(frames[ticker].close)
+
+        dataset = cls(path=path, features=features, index=index, n_rows=n_rows, owner=True)
+        arrays = dataset._open(mode='w+')
+        for ticker, frame in frames.items():
+            offset, length = index[ticker]
+            arrays['dates'][offset:offset + length] = frame.dates.astype('datetime64[ns]').view(np.int64)
+            arrays['close'][offset:offset + length] = frame.close
+            arrays['values'][offset:offset + length] = frame.values
+        for a in arrays.values():
+            a.flush()
+
+        with open(path.joinpath('index.json'), 'w') as f:
+            json.dump({'features': dataset.features, 'index': index, 'n_rows': n_rows}, f)
+        return dataset
+
+    @classmethod
+    def open(cls, path):
+        with open(Path(path).joinpath('index.json')) as f:
+            header = json.load(f)
+        index = {ticker: tuple(span) for ticker, span in header['index'].items()}
+        return cls(path=path, features=header['features'], index=index, n_rows=header['n_rows'])
+
+    @property
+    def tickers(self):
+        return list(self.index.keys())
+
+    def subset(self, tickers):
+        return SharedDataset(path=self.path, features=self.features, index={t: self.index[t] for t in tickers},
+                             n_rows=self.n_rows)
+
+    def slice(self, ranges):
+        # ranges: ticker -> (start, stop) rows of the ticker, e.g. the ranges of a data_management.DfsView
+        index = {}
+        for ticker, (start, stop) in ranges.items():
+            offset, length = self.index[ticker]
+            start, stop = min(start, length), min(stop, length)
+            index[ticker] = (offset + start, max(stop - start, 0))
+        return SharedDataset(path=self.path, features=self.features, index=index, n_rows=self.n_rows)
+
+    def get(self, ticker):
+        arrays = self._get_arrays()
+        offset, length = self.index[ticker]
+        return FeatureFrame(dates=arrays['dates'][offset:offset + length].view('datetime64[ns]'),
+                            close=arrays['close'][offset:offset + length],
+                            values=arrays['values'][offset:offset + length])
+
+    def close(self):
+        self._arrays = None
+        if self.owner:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self):
+        # other processes get the location and index only, and never remove the files
+        return {'path': self.path, 'features': self.features, 'index': self.index, 'n_rows': self.n_rows}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            self._arrays = self._open(mode='r')
+        return self._arrays
+
+    def _open(self, mode):
+        shape = max(self.n_rows, 1)
+        return {'dates': np.memmap(self.path.joinpath('dates.bin'), dtype=np.int64, mode=mode, shape=(shape,)),
+                'close': np.memmap(self.path.joinpath('close.bin'), dtype=np.float64, mode=mode, shape=(shape,)),
+                'values': np.memmap(self.path.joinpath('values.bin'), dtype=np.float32, mode=mode,
+                                    shape=(shape, len(self.features)))}
@@ -0,0 +1,286 @@
+from collections import deque
+import math
+import numpy as np
+
+from features import (feature_specs, _attach_sma, _attach_bollinger_bands, _attach_rsi, _attach_trix, _attach_stoch,
+                      _attach_cci, _attach_aroon, _attach_adx, _attach_macd)
+
+
+nan = float('nan')
+
+
+class StreamingFeatures:
+    """
+    Computes the features of features.py bar by bar. Each update takes the next bar and costs O(1) for the EWM
+    based features (trix, rsi, macd, adx) and O(window) for the rolling ones, instead of recomputing the whole
+    history. After the same bars, the values match those of attach_features up to floating point rounding.
+    """
+    def __init__(self, features):
+        self.features = list(features)
+        self.indicators = []
+        for feature in self.features:
+            attach, params = feature_specs[feature]
+            if not any(a is attach and p == params for a, p, _ in self.indicators):
+                self.indicators.append((attach, params, streaming_indicators[attach](**params)))
+        self.values = dict.fromkeys(self.features, nan)
+        self.last_date = None
+        self.n_bars = 0
+
+    def update(self, high, low, close, date=None):
+        for _, _, indicator in self.indicators:
+            self.values.update(indicator.update(high=high, low=low, close=close))
+        self.last_date = date
+        self.n_bars += 1
+        return self.get_state_for_policy()
+
+    def update_df(self, df):
+        # feeds all bars of df (e.g. the history before going live)
+        for date, high, low, close in zip(df.index, df['High'].values, df['Low'].values, df['Close'].values):
+            self.update(high=float(high), low=float(low), close=float(close), date=date)
+        return self.get_state_for_policy()
+
+    def get_state_for_policy(self, day=None):
+        # same as features.get_state_for_policy(df, day, features) for the last bar
+        if day is not None and day != self.last_date:
+            raise ValueError(f'state of {day} requested, last bar is of {self.last_date}.')
+        return np.array([self.values[feature] for feature in self.features], dtype=np.float32)
+
+
+class Ewm:
+    """
+    pandas ewm(com=com, min_periods=min_periods, adjust=True, ignore_na=False).mean(), one value at a time: update
+    takes the next value and returns the current average (NaN before min_periods observations).
+    """
+    def __init__(self, com, min_periods):
+        self.old_wt_factor = 1. - 1. / (1. + com)
+        self.min_periods = max(min_periods, 1)
+        self.weighted = nan
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, x):
+        is_observation = x == x
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + x) / (self.old_wt + 1.)
+                self.old_wt += 1.
+        elif is_observation:
+            self.weighted = x
+        return self.weighted if self.nobs >= self.min_periods else nan
+
+
+class _Window:
+    # the last size values, with the number of non NaN ones
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.size = size
+        self.n_valid = 0
+
+    def append(self, x):
+        if len(self.values) == self.size and self.values[0] == self.values[0]:
+            self.n_valid -= 1
+        self.values.append(x)
+        self.n_valid += x == x
+
+    def full(self):
+        return self.n_valid == self.size
+
+
+class _Sma:
+    def __init__(self):
+        self.window = _Window(30)
+
+    def update(self, high, low, close):
+        self.window.append(close)
+        sma_5, sma_10, sma_30 = (_rolling_mean(self.window, n) for n in (5, 10, 30))
+        return {'sma_5/10': (sma_5 - sma_10) / sma_10, 'sma_5/30': (sma_5 - sma_30) / sma_30}
+
+
+class _BollingerBands:
+    def __init__(self):
+        self.window = _Window(20)
+
+    def update(self, high, low, close):
+        self.window.append(close)
+        if not self.window.full():
+            return {'perc_bb': nan}
+        mean = sum(self.window.values) / 20
+        std = math.sqrt(sum((x - mean) ** 2 for x in self.window.values) / 19)
+        lower = mean - 2 * std
+        upper = mean + 2 * std
+        return {'perc_bb': _divide(close - lower, upper - lower) - 0.5}
+
+
+class _Rsi:
+    def __init__(self, periods=14):
+        self.periods = periods
+        self.up_ewm = Ewm(com=periods - 1, min_periods=periods)
+        self.down_ewm = Ewm(com=periods - 1, min_periods=periods)
+        self.prev_close = nan
+        self.n = 0
+
+    def update(self, high, low, close):
+        delta = close - self.prev_close
+        self.prev_close = close
+        up = self.up_ewm.update(0. if delta < 0 else delta)
+        down = self.down_ewm.update(abs(0. if delta > 0 else delta))
+        rsi = 100 - 100 / (1 + _divide(up, down))
+        if rsi != rsi and self.n >= self.periods:
+            rsi = 100.
+        self.n += 1
+        return {'rsi': rsi / 100 - 0.5}
+
+
+class _Trix:
+    def __init__(self, periods=15):
+        self.ewms = [Ewm(com=(periods - 1) / 2., min_periods=periods) for _ in range(3)]
+        self.prev_triple_smoothed = nan
+
+    def update(self, high, low, close):
+        triple_smoothed = close
+        for ewm in self.ewms:
+            triple_smoothed = ewm.update(triple_smoothed)
+        trix = 100 * (triple_smoothed / self.prev_triple_smoothed - 1)
+        if triple_smoothed == triple_smoothed:
+            self.prev_triple_smoothed = triple_smoothed
+        return {'trix': trix}
+
+
+class _Stoch:
+    def __init__(self, k_periods=14, d_periods=3):
+        self.min_periods = d_periods
+        self.lows = _Window(k_periods)
+        self.highs = _Window(k_periods)
+        self.ks = _Window(d_periods)
+
+    def update(self, high, low, close):
+        self.lows.append(low)
+        self.highs.append(high)
+        if self.lows.n_valid >= self.min_periods and self.highs.n_valid >= self.min_periods:
+            min_low = min(x for x in self.lows.values if x == x)
+            max_high = max(x for x in self.highs.values if x == x)
+            k = 100 * _divide(close - min_low, max_high - min_low)
+        else:
+            k = nan
+        self.ks.append(k)
+        d = sum(self.ks.values) / len(self.ks.values) if self.ks.full() else nan
+        return {'stoch': (k - d) / 100}
+
+
+class _Cci:
+    def __init__(self, periods=20, c=0.015):
+        self.c = c
+        self.window = _Window(periods)
+
+    def update(self, high, low, close):
+        self.window.append((high + low + close) / 3.0)
+        if not self.window.full():
+            return {'cci': nan}
+        values = np.fromiter(self.window.values, dtype=np.float64, count=self.window.size)
+        mean = values.mean()
+        mean_abs_deviation = np.abs(values - mean).mean()
+        return {'cci': _divide(values[-1] - mean, self.c * mean_abs_deviation) / 200}
+
+
+class _Aroon:
+    def __init__(self, periods=15):
+        self.periods = periods
+        self.window = _Window(periods)
+
+    def update(self, high, low, close):
+        self.window.append(close)
+        if not self.window.full():
+            return {'aroon': nan}
+        values = np.fromiter(self.window.values, dtype=np.float64, count=self.periods)
+        aroon_up = (np.argmax(values) + 1) / self.periods * 100
+        aroon_down = (np.argmin(values) + 1) / self.periods * 100
+        return {'aroon': (aroon_up - aroon_down) / 100}
+
+
+class _Adx:
+    def __init__(self, periods=14):
+        self.periods = periods
+        self.prev = None
+        self.n = 0
+        self.sums = [0., 0., 0.]
+        self.dx_sum = 0.
+        self.adx = nan
+
+    def update(self, high, low, close):
+        prev, self.prev = self.prev, (high, low, close)
+        if prev is None:
+            return {'adx': nan}
+        prev_high, prev_low, prev_close = prev
+
+        tr = max(high, prev_close) - min(low, prev_close)
+        up = high - prev_high
+        dn = prev_low - low
+        pos = up if up > dn and up > 0 else 0.
+        neg = dn if dn > up and dn > 0 else 0.
+
+        # Wilder sums of tr, pos and neg: plain sums over the first periods values, then smoothed
+        p = self.periods
+        self.n += 1
+        decay = 1 - 1 / p
+        for i, x in enumerate((tr, pos, neg)):
+            self.sums[i] = self.sums[i] + x if self.n <= p else decay * self.sums[i] + x
+        if self.n < p:
+            return {'adx': nan}
+
+        trs, pos_sum, neg_sum = self.sums
+        dip = 100 * pos_sum / trs if trs > 0 else 0.
+        din = 100 * neg_sum / trs if trs > 0 else 0.
+        dx = 100 * abs((dip - din) / (dip + din)) if dip + din > 0 else 0.
+
+        # the first adx value is the mean of the first periods dx values, then Wilder smoothed
+        n_dx = self.n - p + 1
+        if n_dx < p:
+            self.dx_sum += dx
+            return {'adx': nan}
+        if n_dx == p:
+            self.adx = (self.dx_sum + dx) / p
+        else:
+            self.adx = (p - 1) / p * self.adx + dx / p
+        return {'adx': self.adx / 100}
+
+
+class _Macd:
+    def __init__(self, signal_periods=9, fast_periods=12, slow_periods=26):
+        self.fast = Ewm(com=(fast_periods - 1) / 2., min_periods=fast_periods)
+        self.slow = Ewm(com=(slow_periods - 1) / 2., min_periods=slow_periods)
+
+    def update(self, high, low, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        return {'macd': (fast - slow) / slow}
+
+
+def _rolling_mean(window, n):
+    if len(window.values) < n:
+        return nan
+    values = list(window.values)[-n:]
+    return sum(values) / n
+
+
+def _divide(a, b):
+    # float division with numpy semantics (inf or nan instead of ZeroDivisionError)
+    if b == 0:
+        return nan if a == 0 or a != a else math.copysign(math.inf, a) * math.copysign(1., b)
+    return a / b
+
+
+# attach function of features.py -> streaming indicator computing the same columns
+streaming_indicators = {
+    _attach_sma: _Sma,
+    _attach_bollinger_bands: _BollingerBands,
+    _attach_rsi: _Rsi,
+    _attach_trix: _Trix,
+    _attach_stoch: _Stoch,
+    _attach_cci: _Cci,
+    _attach_aroon: _Aroon,
+    _attach_adx: _Adx,
+    _attach_macd: _Macd,
+}
@@ -1,5 +1,5 @@
 import unittest
-from account_management import AccountState
+from account_management import AccountState, invariant_checks
 
 
 class TestAccountState(unittest.TestCase):
@@ -16,6 +16,15 @@ class TestAccountState(unittest.TestCase):
         self.assertRaises(ValueError, lambda: AccountState(floating=10, units=1, long_positions=0, market_price=10))
         self.assertRaises(ValueError, lambda: AccountState(floating=10, units=2, long_positions=0, market_price=10))
 
+    def test_invariant_checks_switch(self):
+        with invariant_checks(False):
+            a = AccountState(floating=2.0)
+            self.assertEquals(a.floating, 2.0)
+        self.assertRaises(ValueError, lambda: AccountState(floating=2.0))
+
+        a = AccountState(fixed=100, market_price=10)
+        self.assertRaises(AttributeError, lambda: setattr(a, 'other', 1))
+
     def test_total(self):
         a = AccountState()
         self.assertEquals(a.total(), 0.0)
@@ -247,3 +256,35 @@ class TestAccountState(unittest.TestCase):
         self.assertEquals(post.market_price, pre.market_price)
         self.assertEquals(post.total(), pre.total())
         self.assertAlmostEquals(post.alloc(), 0.96, places=2)
+
+    def assert_units_to_close_shorts(self, pre, target_alloc):
+        self.assertLess(pre.alloc(), target_alloc)
+
+        expected = 0
+        state = pre
+        while state.alloc() < target_alloc:
+            state = state._buy(1)
+            expected += 1
+
+        units = pre.get_units_to_trade(target_alloc=target_alloc)
+        self.assertEquals(units, expected)
+        self.assertGreaterEqual(pre.trade(units=units).alloc(), target_alloc)
+
+    def test_units_to_close_shorts(self):
+        pre = AccountState(fixed=1000, market_price=10)
+        pre = pre.trade(units=-40).update(market_price=8).trade(units=-30).update(market_price=13)
+        self.assertEquals(pre.short_positions, [10] * 40 + [8] * 30)
+        self.assertAlmostEquals(pre.alloc(), -0.51, places=2)
+
+        for target_alloc in [-0.45, -0.3, -0.1, -0.01]:
+            self.assert_units_to_close_shorts(pre=pre, target_alloc=target_alloc)
+
+    def test_units_to_close_shorts_with_losing_lots(self):
+        pre = AccountState(fixed=1000, market_price=4)
+        pre = pre.trade(units=-5).update(market_price=10).trade(units=-10).update(market_price=9)
+        self.assertEquals(pre.short_positions, [4] * 5 + [10] * 10)
+        self.assertAlmostEquals(pre.alloc(), -0.11, places=2)
+
+        for target_alloc in [-0.1, -0.05, -0.01]:
+            self.assert_units_to_close_shorts(pre=pre, target_alloc=target_alloc)
+        self.assertEquals(pre.get_units_to_trade(target_alloc=-0.05), 11)
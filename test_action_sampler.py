@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+
+from action_sampler import ActionSampler
+
+
+class TestActionSampler(unittest.TestCase):
+    def test_frequencies(self):
+        prob = np.array([[0.5, 0.0, 0.3, 0.2], [0.0, 0.0, 0.0, 1.0]], dtype=np.float32)
+        actions, log_probs = ActionSampler(seed=0).sample(np.repeat(prob, 20000, axis=0))
+        np.testing.assert_allclose(log_probs, np.log(np.repeat(prob, 20000, axis=0)[np.arange(40000), actions]))
+
+        frequencies = np.bincount(actions[:20000], minlength=4) / 20000
+        np.testing.assert_allclose(frequencies, prob[0], atol=0.01)
+        self.assertEqual(frequencies[1], 0)
+        self.assertTrue((actions[20000:] == 3).all())
+
+    def test_seed_and_greedy(self):
+        prob = np.random.default_rng(0).dirichlet(np.ones(5), size=100)
+        a, _ = ActionSampler(seed=3).sample(prob)
+        b, _ = ActionSampler(seed=3).sample(prob)
+        np.testing.assert_array_equal(a, b)
+
+        actions, log_probs = ActionSampler(seed=3).sample(prob, greedy=True)
+        np.testing.assert_array_equal(actions, prob.argmax(axis=1))
+        np.testing.assert_allclose(log_probs, np.log(prob.max(axis=1)))
+
+        # a single policy gives scalars
+        action, log_prob = ActionSampler(seed=3).sample(prob[0])
+        self.assertEqual(np.shape(action), ())
+        self.assertAlmostEqual(float(log_prob), np.log(prob[0, action]))
+
+    def test_nan_policy(self):
+        prob = np.full((4, 3), 1 / 3)
+        prob[2, 1] = np.nan
+        with self.assertRaisesRegex(ValueError, r'rows \[2\]'):
+            ActionSampler(seed=0).sample(prob)
+        with self.assertRaises(ValueError):
+            ActionSampler(seed=0).sample(prob[2], greedy=True)
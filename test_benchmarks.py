@@ -0,0 +1,18 @@
+import unittest
+
+from benchmarks import compare
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_compare(self):
+        baseline = {'a': {'us_per_call': 10.0}, 'b': {'us_per_call': 10.0}, 'c': {'us_per_call': 10.0}}
+        results = {'a': {'us_per_call': 12.0}, 'b': {'us_per_call': 14.0}, 'new': {'us_per_call': 1.0}}
+
+        comparison, regressions, missing = compare(results=results, baseline=baseline, threshold=0.25)
+        self.assertEqual(set(comparison), {'a', 'b'})
+        self.assertEqual(comparison['b'], (10.0, 14.0, 1.4))
+        self.assertEqual(regressions, ['b'])
+        self.assertEqual(missing, ['c'])
+
+        _, regressions, _ = compare(results=results, baseline=baseline, threshold=0.5)
+        self.assertEqual(regressions, [])
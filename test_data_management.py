@@ -0,0 +1,79 @@
+import unittest
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+
+from data_management import filter_dfs, train_test_split, walk_forward_folds, fold_split, Fold
+from testing_utils import load_ticker_df
+
+
+filter_kwargs = {'min_ts_len': 3000,
+                 'max_days_break': pd.Timedelta(days=7),
+                 'max_first_date': pd.Timestamp('1998-01-01'),
+                 'min_first_date': pd.Timestamp('1993-01-01'),
+                 'min_last_date': pd.Timestamp('2019-10-31'),
+                 'n_rows_to_remove_start': 300}
+
+
+class TestFilterDfs(unittest.TestCase):
+    def test_rejection_reasons(self):
+        df = load_ticker_df('MMM')
+        gap = df.drop(df.loc['2005-03-01':'2005-03-20'].index)
+        low_volume = df.copy()
+        low_volume.loc['2010-06-01':'2010-06-10', 'Volume'] = 10
+        with_nan = df.astype(object)
+        with_nan.loc['2010-06-02', 'Close'] = 'NaN'
+        dfs = {'MMM': df,
+               'SHORT': df.iloc[-2000:],
+               'LATE': df.loc['2000-01-01':],
+               'GAP': gap,
+               'LOW_VOLUME': low_volume,
+               'NAN': with_nan}
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            filtered_dfs, report = filter_dfs(dfs=dfs, **filter_kwargs)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual(list(filtered_dfs.keys()), ['MMM', 'NAN'])
+        self.assertEqual(report['reason'].to_dict(), {'MMM': None, 'SHORT': 'n_points', 'LATE': 'date_range',
+                                                      'GAP': 'continuity', 'LOW_VOLUME': 'volume_min', 'NAN': None})
+
+        expected = df.iloc[300:].loc[filter_kwargs['min_first_date']:]
+        pd.testing.assert_frame_equal(filtered_dfs['MMM'], expected)
+        self.assertEqual(report.loc['MMM', 'n_points'], len(expected))
+        self.assertEqual(report.loc['MMM', 'first_date'], expected.index[0])
+        self.assertEqual(report.loc['NAN', 'n_points'], len(expected) - 1)
+        self.assertFalse(filtered_dfs['NAN'].isna().any().any())
+        self.assertGreater(report.loc['GAP', 'max_days_break'], pd.Timedelta(days=7))
+        np.testing.assert_array_equal(filtered_dfs['NAN'].index, expected.index.drop(pd.Timestamp('2010-06-02')))
+
+
+class TestSplits(unittest.TestCase):
+    def test_train_test_split_views(self):
+        dfs = {ticker: load_ticker_df(ticker) for ticker in ['MMM', 'XOM']}
+        split_date = pd.Timestamp('2015-01-02')
+        train_dfs, test_dfs = train_test_split(dfs=dfs, split_date=split_date)
+
+        for ticker, df in dfs.items():
+            pd.testing.assert_frame_equal(train_dfs[ticker], df[:split_date])
+            pd.testing.assert_frame_equal(test_dfs[ticker], df[split_date:])
+            self.assertTrue(np.shares_memory(train_dfs[ticker]['Close'].values, df['Close'].values))
+            self.assertTrue(np.shares_memory(test_dfs[ticker]['Close'].values, df['Close'].values))
+
+    def test_walk_forward_folds(self):
+        folds = walk_forward_folds(first_test_date=pd.Timestamp('2016-01-01'),
+                                   last_test_date=pd.Timestamp('2018-01-01'),
+                                   test_period=pd.DateOffset(years=1),
+                                   train_period=pd.DateOffset(years=5))
+        dates = [pd.Timestamp(f'{year}-01-01') for year in range(2011, 2019)]
+        self.assertEqual(folds, [Fold(dates[0], dates[5], dates[6]), Fold(dates[1], dates[6], dates[7])])
+
+        df = load_ticker_df('MMM')
+        dfs = {'MMM': df, 'SHORT': df.loc['2016-06-01':]}
+        train_dfs, test_dfs = fold_split(dfs=dfs, fold=folds[0], min_ts_len=100)
+        self.assertEqual(list(train_dfs.keys()), ['MMM'])
+        self.assertEqual(list(test_dfs.keys()), ['MMM', 'SHORT'])
+        pd.testing.assert_frame_equal(train_dfs['MMM'], df.loc['2011-01-01':'2015-12-31'])
+        pd.testing.assert_frame_equal(test_dfs['MMM'], df.loc['2016-01-01':'2016-12-31'])
+        pd.testing.assert_frame_equal(test_dfs['SHORT'], df.loc['2016-06-01':'2016-12-31'])
@@ -0,0 +1,111 @@
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+import pandas as pd
+
+from downloader import DirectorySource, update_data, checkpoint_file_name
+
+
+base_data_path = Path(__file__).parent.joinpath('data')
+tickers = ['MMM', 'XOM']
+
+
+class _FailingSource(DirectorySource):
+    def __init__(self, path, failing):
+        super().__init__(path)
+        self.failing = failing
+        self.fetched = []
+
+    def fetch(self, ticker, start=None):
+        self.fetched.append(ticker)
+        if ticker in self.failing:
+            raise ConnectionError(ticker)
+        return super().fetch(ticker, start=start)
+
+
+def _read_csv(path):
+    df = pd.read_csv(path, header=0, index_col='Date')
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+class TestUpdateData(unittest.TestCase):
+    def setUp(self):
+        self.source_path = Path(tempfile.mkdtemp())
+        self.local_path = Path(tempfile.mkdtemp())
+        for ticker in tickers:
+            shutil.copy(base_data_path.joinpath(f'{ticker}.csv'), self.source_path)
+        # MMM is stored up to 2019-06-28, XOM is not stored at all
+        _read_csv(self.source_path.joinpath('MMM.csv')).loc[:'2019-06-28'].to_csv(self.local_path.joinpath('MMM.csv'))
+
+    def tearDown(self):
+        shutil.rmtree(self.source_path)
+        shutil.rmtree(self.local_path)
+
+    def test_incremental_update(self):
+        n_new = update_data(tickers=tickers + ['MISSING'], base_data_path=self.local_path,
+                            source=DirectorySource(self.source_path), n_threads=2)
+
+        expected_mmm = _read_csv(self.source_path.joinpath('MMM.csv'))
+        self.assertEqual(n_new, {'MMM': len(expected_mmm.loc['2019-06-29':]),
+                                 'XOM': len(_read_csv(self.source_path.joinpath('XOM.csv'))),
+                                 'MISSING': 0})
+        for ticker in tickers:
+            pd.testing.assert_frame_equal(_read_csv(self.local_path.joinpath(f'{ticker}.csv')),
+                                          _read_csv(self.source_path.joinpath(f'{ticker}.csv')), check_dtype=False)
+
+        n_new = update_data(tickers=tickers, base_data_path=self.local_path, source=DirectorySource(self.source_path))
+        self.assertEqual(n_new, {'MMM': 0, 'XOM': 0})
+        self.assertFalse(self.local_path.joinpath(checkpoint_file_name).exists())
+
+    def test_resume_after_failure(self):
+        source = _FailingSource(self.source_path, failing={'XOM'})
+        n_new = update_data(tickers=tickers, base_data_path=self.local_path, source=source)
+        self.assertIsNone(n_new['XOM'])
+        self.assertTrue(self.local_path.joinpath(checkpoint_file_name).exists())
+
+        source = _FailingSource(self.source_path, failing=set())
+        n_new = update_data(tickers=tickers, base_data_path=self.local_path, source=source)
+        self.assertEqual(source.fetched, ['XOM'])
+        self.assertGreater(n_new['MMM'], 0)
+        self.assertGreater(n_new['XOM'], 0)
+        self.assertFalse(self.local_path.joinpath(checkpoint_file_name).exists())
+
+    def test_stale_checkpoint_is_ignored(self):
+        # a checkpoint left behind by an earlier update, e.g. because a ticker kept failing
+        with open(self.local_path.joinpath(checkpoint_file_name), 'w') as f:
+            json.dump({'run_date': '2000-01-01', 'completed': {'MMM': 0, 'XOM': None}}, f)
+
+        source = _FailingSource(self.source_path, failing=set())
+        n_new = update_data(tickers=tickers, base_data_path=self.local_path, source=source)
+        self.assertEqual(sorted(source.fetched), ['MMM', 'XOM'])
+        self.assertGreater(n_new['MMM'], 0)
+        self.assertFalse(self.local_path.joinpath(checkpoint_file_name).exists())
+
+    def test_adjusted_history_is_refetched(self):
+        # a 2:1 split adjusts all prices before it
+        df = _read_csv(self.source_path.joinpath('MMM.csv'))
+        df[['Open', 'High', 'Low', 'Close']] /= 2
+        df.to_csv(self.source_path.joinpath('MMM.csv'))
+
+        n_new = update_data(tickers=['MMM'], base_data_path=self.local_path, source=DirectorySource(self.source_path))
+        self.assertEqual(n_new, {'MMM': len(df.loc['2019-06-29':])})
+        pd.testing.assert_frame_equal(_read_csv(self.local_path.joinpath('MMM.csv')), df, check_dtype=False)
+
+    def test_failed_refetch_keeps_history(self):
+        # the source lost MMM, e.g. delisted: the overlap check fails and the full refetch comes back empty
+        stored = self.local_path.joinpath('MMM.csv').read_text()
+        self.source_path.joinpath('MMM.csv').unlink()
+        n_new = update_data(tickers=['MMM'], base_data_path=self.local_path, source=DirectorySource(self.source_path))
+        self.assertEqual(n_new, {'MMM': None})
+        self.assertEqual(self.local_path.joinpath('MMM.csv').read_text(), stored)
+
+        # a refetch shorter than the stored history
+        df = _read_csv(base_data_path.joinpath('MMM.csv')).iloc[-100:]
+        df[['Open', 'High', 'Low', 'Close']] /= 2
+        df.to_csv(self.source_path.joinpath('MMM.csv'))
+        n_new = update_data(tickers=['MMM'], base_data_path=self.local_path, source=DirectorySource(self.source_path))
+        self.assertEqual(n_new, {'MMM': None})
+        self.assertEqual(self.local_path.joinpath('MMM.csv').read_text(), stored)
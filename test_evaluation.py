@@ -0,0 +1,68 @@
+import unittest
+import torch
+
+from evaluation import evaluate_policy, evaluate_baseline
+from ppo import PPO
+from testing_utils import load_ticker_dfs
+
+
+features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+allocations = [-0.6, -0.3, 0.0, 0.3, 0.6]
+
+
+class TestEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.dfs = load_ticker_dfs(tickers=['AAPL', 'MMM', 'XOM', 'IBM'], n_points=400)
+
+    def test_policy_independent_of_n_workers(self):
+        torch.manual_seed(0)
+        state_dict = PPO(dim_state=len(features), dim_actions=len(allocations)).state_dict()
+
+        results = []
+        for n_workers in [1, 3]:
+            results.append(list(evaluate_policy(state_dict=state_dict,
+                                                dfs=self.dfs,
+                                                features=features,
+                                                allocations=allocations,
+                                                starting_acc_balance=10000.0,
+                                                n_start_point_to_ignore=100,
+                                                n_episodes=12,
+                                                seed=7,
+                                                n_workers=n_workers)))
+
+        self.assertEqual(len(results[0]), 12)
+        self.assertEqual(results[0], results[1])
+        self.assertGreater(len(set(ticker for ticker, _ in results[0])), 1)
+
+    def test_baseline_independent_of_n_workers(self):
+        results = []
+        for n_workers in [1, 2]:
+            results.append(list(evaluate_baseline(allocation=0.8,
+                                                  dfs=self.dfs,
+                                                  starting_acc_balance=10000.0,
+                                                  n_start_point_to_ignore=100,
+                                                  n_workers=n_workers)))
+
+        self.assertEqual([ticker for ticker, _ in results[0]], list(self.dfs.keys()))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(results[0][0][1]), 299)
+
+    def test_interleaved_evaluations(self):
+        torch.manual_seed(0)
+        state_dict = PPO(dim_state=len(features), dim_actions=len(allocations)).state_dict()
+        kwargs = {'state_dict': state_dict, 'features': features, 'allocations': allocations,
+                  'starting_acc_balance': 10000.0, 'n_start_point_to_ignore': 100, 'n_episodes': 4, 'seed': 7}
+
+        expected = list(evaluate_policy(dfs=self.dfs, **kwargs))
+        other_dfs = {'AAPL': self.dfs['AAPL']}
+        episodes = evaluate_policy(dfs=self.dfs, **kwargs)
+        baseline = evaluate_baseline(allocation=0.8, dfs=other_dfs, starting_acc_balance=10000.0,
+                                     n_start_point_to_ignore=100)
+        results = [next(episodes), next(baseline)[0]]
+        other = list(evaluate_policy(dfs=other_dfs, **kwargs))
+        results.extend(episodes)
+
+        self.assertEqual(results[0], expected[0])
+        self.assertEqual(results[1], 'AAPL')
+        self.assertEqual(results[2:], expected[1:])
+        self.assertEqual(set(ticker for ticker, _ in other), {'AAPL'})
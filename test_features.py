@@ -0,0 +1,95 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from features import _attach_cci, _attach_aroon, _attach_adx, attach_features, feature_specs
+from testing_utils import base_data_path, load_ticker_df
+
+
+def _reference_cci(df, periods=20, c=0.015):
+    typical_price = (df['High'] + df['Low'] + df['Close']) / 3.0
+    mean_abs_deviation = lambda x: np.mean(np.abs(x-np.mean(x)))
+    cci = ((typical_price - typical_price.rolling(periods, min_periods=periods).mean())
+           / (c * typical_price.rolling(periods, min_periods=0).apply(mean_abs_deviation, True)))
+    return cci / 200
+
+
+def _reference_aroon(df, periods=15):
+    aroon_up = df['Close'].rolling(periods, min_periods=periods).apply(lambda x: float(np.argmax(x) + 1) / periods * 100,
+                                                                 raw=True)
+    aroon_down = df['Close'].rolling(periods, min_periods=0).apply(lambda x: float(np.argmin(x) + 1) / periods * 100,
+                                                             raw=True)
+    return (aroon_up - aroon_down) / 100
+
+
+def _reference_adx(df, periods=14):
+    high, low, close = df['High'].values, df['Low'].values, df['Close'].values
+    tr, pos, neg = [], [], []
+    for i in range(1, len(df)):
+        tr.append(max(high[i], close[i - 1]) - min(low[i], close[i - 1]))
+        up = high[i] - high[i - 1]
+        dn = low[i - 1] - low[i]
+        pos.append(up if up > dn and up > 0 else 0.0)
+        neg.append(dn if dn > up and dn > 0 else 0.0)
+
+    trs, poss, negs = [sum(tr[:periods])], [sum(pos[:periods])], [sum(neg[:periods])]
+    for i in range(periods, len(tr)):
+        trs.append(trs[-1] - trs[-1] / periods + tr[i])
+        poss.append(poss[-1] - poss[-1] / periods + pos[i])
+        negs.append(negs[-1] - negs[-1] / periods + neg[i])
+
+    dx = []
+    for t, p, n in zip(trs, poss, negs):
+        dip, din = (100 * p / t, 100 * n / t) if t > 0 else (0.0, 0.0)
+        dx.append(100 * abs((dip - din) / (dip + din)) if dip + din > 0 else 0.0)
+
+    adx = [np.nan] * (2 * periods - 1) + [sum(dx[:periods]) / periods]
+    for i in range(periods, len(dx)):
+        adx.append((adx[-1] * (periods - 1) + dx[i]) / periods)
+    return pd.Series(adx, index=df.index) / 100
+
+
+class TestFeatures(unittest.TestCase):
+    def assert_parity(self, expected, actual, ticker):
+        expected = expected.values
+        actual = actual.values
+        np.testing.assert_array_equal(np.isnan(expected), np.isnan(actual), err_msg=ticker)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=ticker)
+
+    def test_cci_aroon_parity(self):
+        paths = sorted(base_data_path.glob('*.csv'))
+        self.assertTrue(len(paths) > 0)
+
+        for path in paths:
+            df = load_ticker_df(path.stem)
+            _attach_cci(df=df, periods=20, c=0.015)
+            _attach_aroon(df=df, periods=15)
+
+            self.assert_parity(expected=_reference_cci(df=df, periods=20, c=0.015), actual=df['cci'], ticker=path.stem)
+            self.assert_parity(expected=_reference_aroon(df=df, periods=15), actual=df['aroon'], ticker=path.stem)
+
+    def test_short_series(self):
+        df = load_ticker_df('AAPL').iloc[:10]
+        _attach_cci(df=df, periods=20, c=0.015)
+        _attach_aroon(df=df, periods=15)
+        self.assertTrue(df['cci'].isna().all())
+        self.assertTrue(df['aroon'].isna().all())
+
+    def test_adx(self):
+        for ticker in ['AAPL', 'MMM', 'XOM']:
+            df = load_ticker_df(ticker)
+            _attach_adx(df=df, periods=14)
+            self.assert_parity(expected=_reference_adx(df=df, periods=14), actual=df['adx'], ticker=ticker)
+            self.assertTrue(((df['adx'].dropna() >= 0) & (df['adx'].dropna() <= 1)).all())
+
+    def test_attach_selected_features(self):
+        df = load_ticker_df('AAPL')
+        attach_features(df=df, features=['adx', 'rsi'])
+        self.assertIn('adx', df.columns)
+        self.assertIn('rsi', df.columns)
+        self.assertNotIn('cci', df.columns)
+
+        df = load_ticker_df('AAPL')
+        attach_features(df=df)
+        for feature in feature_specs.keys():
+            self.assertIn(feature, df.columns)
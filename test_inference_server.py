@@ -0,0 +1,78 @@
+import unittest
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import torch
+
+from ppo import PPO
+from inference_server import InferenceServer, InferenceClient
+
+
+base_data_path = Path(__file__).parent.joinpath('data')
+features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+allocations = [-0.5, 0.0, 0.5]
+
+
+class TestInferenceServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = Path(tempfile.mkdtemp())
+        torch.manual_seed(0)
+        self.model = PPO(dim_state=len(features), dim_actions=len(allocations))
+        torch.save(self.model.state_dict(), self.tmp_path.joinpath('model.pt'))
+        models = {'ppo': {'path': self.tmp_path.joinpath('model.pt'), 'features': features, 'allocations': allocations}}
+        self.server = InferenceServer(models=models).start()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp_path)
+
+    def _expected_allocation(self, state):
+        with torch.no_grad():
+            return allocations[int(self.model.pi(torch.tensor(state, dtype=torch.float32)).argmax())]
+
+    def test_states(self):
+        rng = np.random.default_rng(0)
+        states = {f'T{i}': rng.normal(size=len(features)).tolist() for i in range(20)}
+        states['WARMUP'] = [np.nan] * len(features)
+
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.update({i: self.server.predict('ppo', states=states)}))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for result in results.values():
+            self.assertIsNone(result['allocations'].pop('WARMUP'))
+            self.assertEqual(result['allocations'], {ticker: self._expected_allocation(state)
+                                                     for ticker, state in states.items() if ticker != 'WARMUP'})
+        with self.assertRaises(ValueError):
+            self.server.predict('ppo', states={'T0': [0.0]})
+
+        stats = self.server.stats()
+        self.assertEqual(stats['n_requests'], 8)
+        self.assertLessEqual(stats['n_batches'], 8)
+        self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+
+    def test_bars_over_tcp(self):
+        df = pd.read_csv(base_data_path.joinpath('MMM.csv'), header=0, index_col='Date').iloc[-80:]
+        client = InferenceClient(*self.server.serve())
+        try:
+            responses = [client.predict('ppo', bars={'MMM': {'high': bar['High'], 'low': bar['Low'],
+                                                             'close': bar['Close'], 'date': date}})
+                         for date, bar in df.iterrows()]
+            self.assertEqual(client.stats()['n_requests'], len(df))
+        finally:
+            client.close()
+
+        # no allocation during the indicators' warm-up, one per bar afterwards
+        is_none = [response['allocations']['MMM'] is None for response in responses]
+        n_warm_up = is_none.index(False)
+        self.assertGreater(n_warm_up, 20)
+        self.assertFalse(any(is_none[n_warm_up:]))
+        for response in responses[n_warm_up:]:
+            self.assertIn(response['allocations']['MMM'], allocations)
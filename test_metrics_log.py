@@ -0,0 +1,100 @@
+import unittest
+import io
+import contextlib
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+import runs
+from metrics_log import MetricsLog, MetricsReader, MetricsTail
+
+
+base_data_path = Path(__file__).parent.joinpath('data')
+
+
+class TestMetricsLog(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp()).joinpath('log')
+
+    def tearDown(self):
+        shutil.rmtree(self.path.parent)
+
+    def test_buffered_append_and_tail(self):
+        rng = np.random.default_rng(0)
+        means = rng.normal(size=50)
+        stds = rng.random(size=50) + 0.5
+
+        log = MetricsLog(self.path, flush_every=8)
+        tail = MetricsTail(self.path, span=10, min_periods=3)
+        for i in range(20):
+            log.append(episode=i + 1, steps=100, mean=means[i], std=stds[i])
+        # only full batches are written before a flush
+        first = tail.read()
+        self.assertEqual(len(first), 16)
+        log.flush()
+        second = tail.read()
+        self.assertEqual(list(second.index), list(range(16, 20)))
+        self.assertEqual(len(tail.read()), 0)
+        log.close()
+
+        # appending to an existing log continues it
+        with MetricsLog(self.path, flush_every=8) as log:
+            for i in range(20, 50):
+                log.append(episode=i + 1, steps=100, mean=means[i], std=stds[i])
+        df = pd.concat([first, second, tail.read()])
+        tail.close()
+
+        np.testing.assert_array_equal(df['episode'].values, np.arange(1, 51))
+        self.assertTrue((df['n_updates'] == -1).all())
+        self.assertTrue(df['policy_loss'].isna().all())
+        # the incremental EMAs match those computed over the whole history
+        expected = pd.Series(means).ewm(span=10, min_periods=3).mean()
+        np.testing.assert_allclose(df['mean_ema'].values, expected.values, rtol=1e-12)
+        np.testing.assert_allclose(df['sharpe_ratio_ema'].values,
+                                   (expected / pd.Series(stds).ewm(span=10, min_periods=3).mean()).values, rtol=1e-12)
+
+    def test_partial_record(self):
+        with MetricsLog(self.path) as log:
+            log.append(episode=1, steps=10, mean=0.1, std=1.0)
+        # an interrupted flush: the record is in some columns only
+        with open(self.path.joinpath('episode.bin'), 'ab') as f:
+            f.write(np.array([2], dtype=np.int64).tobytes())
+        reader = MetricsReader(self.path)
+        self.assertEqual(list(reader.read()['episode']), [1])
+        reader.close()
+
+        with MetricsLog(self.path) as log:
+            log.append(episode=2, steps=10, mean=0.2, std=1.0)
+        reader = MetricsReader(self.path)
+        np.testing.assert_array_equal(reader.read()['episode'].values, [1, 2])
+        reader.close()
+
+        with self.assertRaises(ValueError):
+            MetricsLog(self.path, columns=[('episode', 'int64')])
+
+    def test_train(self):
+        df = pd.read_csv(base_data_path.joinpath('MMM.csv'), header=0, index_col='Date')
+        df.index = pd.to_datetime(df.index)
+        n_train_episodes = runs.n_train_episodes
+        runs.n_train_episodes = 3
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs.train(allocations=[-0.5, 0.0, 0.5],
+                           features=['trix', 'rsi'],
+                           model_path=self.path.parent.joinpath('m.pt'),
+                           dfs={'MMM': df.loc['2017-01-01':]},
+                           n_start_point_to_ignore=50,
+                           n_envs=2,
+                           metrics_path=self.path)
+        finally:
+            runs.n_train_episodes = n_train_episodes
+
+        reader = MetricsReader(self.path)
+        metrics = reader.read()
+        reader.close()
+        np.testing.assert_array_equal(metrics['episode'].values, [1, 2, 3])
+        np.testing.assert_array_equal(metrics['total_steps'].values, metrics['steps'].cumsum().values)
+        self.assertTrue((metrics['n_updates'] >= 1).all())
+        self.assertTrue(np.isfinite(metrics[['policy_loss', 'value_loss', 'train_seconds']].values).all())
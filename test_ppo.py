@@ -0,0 +1,119 @@
+import unittest
+import numpy as np
+import torch
+
+from ppo import PPO, get_advantages, gamma, lmbda, buffer_capacity
+from rollout_buffer import RolloutBuffer
+
+
+def _reference_advantages(delta, done_mask):
+    advantage = np.zeros_like(delta)
+    next_advantage = 0.0
+    for t in reversed(range(len(delta))):
+        next_advantage = delta[t] + gamma * lmbda * done_mask[t] * next_advantage
+        advantage[t] = next_advantage
+    return advantage
+
+
+class TestPPO(unittest.TestCase):
+    def test_advantages(self):
+        rng = np.random.default_rng(0)
+        delta = rng.normal(size=(100, 1)).astype(np.float32)
+
+        done_mask = np.ones((100, 1), dtype=np.float32)
+        done_mask[-1] = 0
+        np.testing.assert_allclose(get_advantages(delta=delta, done_mask=done_mask),
+                                   _reference_advantages(delta, done_mask), rtol=1e-5, atol=1e-6)
+
+        # (T, N) layout with episodes ending inside the batch
+        delta = rng.normal(size=(50, 4)).astype(np.float32)
+        done_mask = (rng.random(size=(50, 4)) > 0.1).astype(np.float32)
+        expected = np.stack([_reference_advantages(delta[:, i], done_mask[:, i]) for i in range(4)], axis=1)
+        np.testing.assert_allclose(get_advantages(delta=delta, done_mask=done_mask), expected, rtol=1e-5, atol=1e-6)
+
+    def test_train_net(self):
+        torch.manual_seed(0)
+        rng = np.random.default_rng(0)
+        model = PPO(dim_state=5, dim_actions=3)
+        for t in range(20):
+            model.put_data((rng.normal(size=5).astype(np.float32), int(rng.integers(3)), float(rng.normal()),
+                            rng.normal(size=5).astype(np.float32), 1 / 3, t == 19))
+        weights = [p.detach().clone() for p in model.parameters()]
+
+        model.train_net()
+        self.assertEqual(model.buffer.n[0], 0)
+        self.assertTrue(all(not torch.equal(w, p) for w, p in zip(weights, model.parameters())))
+
+        prob, v = model.pi_v(torch.zeros((2, 5)), softmax_dim=1)
+        torch.testing.assert_close(prob, model.pi(torch.zeros((2, 5)), softmax_dim=1))
+        torch.testing.assert_close(v, model.v(torch.zeros((2, 5))))
+
+    def test_batch_layouts(self):
+        rng = np.random.default_rng(0)
+        transitions = [(rng.normal(size=5).astype(np.float32), int(rng.integers(3)), float(rng.normal()),
+                        rng.normal(size=5).astype(np.float32), 1 / 3, t == 19) for t in range(20)]
+
+        # put_data gives the same update as the original list of tuples batch
+        torch.manual_seed(0)
+        model = PPO(dim_state=5, dim_actions=3)
+        torch.manual_seed(0)
+        reference = PPO(dim_state=5, dim_actions=3)
+        for transition in transitions:
+            model.put_data(transition)
+        model.train_net()
+
+        s, a, r, s_prime, prob_a, done = (torch.tensor(np.array(x), dtype=torch.float) for x in zip(*transitions))
+        reference.train_net(batch=(s, a.long()[:, None], r[:, None], s_prime, 1 - done[:, None],
+                                   torch.log(prob_a)[:, None]))
+        for p, q in zip(model.parameters(), reference.parameters()):
+            torch.testing.assert_close(p, q)
+
+        # (T, N) layout
+        buffer = RolloutBuffer(capacity=10, dim_state=5, n_envs=4)
+        for t in range(10):
+            buffer.add(s=rng.normal(size=(4, 5)), a=rng.integers(3, size=4), r=rng.normal(size=4),
+                       s_prime=rng.normal(size=(4, 5)), log_prob_a=np.full(4, np.log(1 / 3)), done=np.full(4, t == 9),
+                       envs=np.arange(4))
+        weights = [p.detach().clone() for p in model.parameters()]
+        model.train_net(batch=buffer.get())
+        self.assertTrue(all(not torch.equal(w, p) for w, p in zip(weights, model.parameters())))
+
+    def test_put_data_beyond_capacity(self):
+        rng = np.random.default_rng(0)
+        model = PPO(dim_state=5, dim_actions=3)
+        n = buffer_capacity + 10
+        for t in range(n):
+            model.put_data((rng.normal(size=5).astype(np.float32), int(rng.integers(3)), float(rng.normal()),
+                            rng.normal(size=5).astype(np.float32), 1 / 3, t == n - 1))
+        self.assertEqual(len(model.make_batch()[0]), n)
+
+    def test_pi_numpy(self):
+        torch.manual_seed(0)
+        rng = np.random.default_rng(0)
+        model = PPO(dim_state=5, dim_actions=3)
+        states = rng.normal(size=(8, 5)).astype(np.float32)
+        with torch.no_grad():
+            np.testing.assert_allclose(model.pi_numpy(states),
+                                       model.pi(torch.from_numpy(states), softmax_dim=1).numpy(),
+                                       rtol=1e-5, atol=1e-7)
+            np.testing.assert_allclose(model.pi_numpy(states[0]), model.pi(torch.from_numpy(states[0])).numpy(),
+                                       rtol=1e-5, atol=1e-7)
+
+        # the exported weights follow train_net and load_state_dict
+        for t in range(10):
+            model.put_data((states[t % 8], int(rng.integers(3)), float(rng.normal()), states[(t + 1) % 8], 1 / 3,
+                            t == 9))
+        model.train_net()
+        other = PPO(dim_state=5, dim_actions=3)
+        other.load_state_dict(model.state_dict())
+        with torch.no_grad():
+            expected = model.pi(torch.from_numpy(states), softmax_dim=1).numpy()
+        np.testing.assert_allclose(model.pi_numpy(states), expected, rtol=1e-5, atol=1e-7)
+        np.testing.assert_allclose(other.pi_numpy(states), expected, rtol=1e-5, atol=1e-7)
+
+        # exported arrays are copies, parameter changes only show after the next export
+        self.assertFalse(any(np.shares_memory(w, p.detach().numpy())
+                             for w in model.numpy_weights for p in model.parameters()))
+        with torch.no_grad():
+            model.fc_pi.bias[0] += 1.0
+        np.testing.assert_allclose(model.pi_numpy(states), expected, rtol=1e-5, atol=1e-7)
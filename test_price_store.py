@@ -0,0 +1,80 @@
+import unittest
+import io
+import contextlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore, LazyPriceDfs, build_price_store, price_columns
+from data_management import load_dfs, save_dfs
+
+
+base_data_path = Path(__file__).parent.joinpath('data')
+tickers = ['AAPL', 'MMM', 'XOM']
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = Path(tempfile.mkdtemp())
+        for ticker in tickers:
+            shutil.copy(base_data_path.joinpath(f'{ticker}.csv'), self.tmp_path)
+        self.store_path = build_price_store(base_data_path=self.tmp_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_round_trip(self):
+        store = PriceStore(self.store_path)
+        self.assertEqual(store.tickers, tickers)
+
+        for ticker in tickers:
+            expected = pd.read_csv(self.tmp_path.joinpath(f'{ticker}.csv'), header=0, index_col='Date')
+            expected.index = pd.to_datetime(expected.index)
+            df = store.get_df(ticker)
+
+            self.assertTrue(df.index.equals(expected.index))
+            self.assertEqual(list(df.columns), price_columns)
+            np.testing.assert_allclose(df.values, expected[price_columns].values, rtol=1e-6, equal_nan=True)
+
+    def test_arrays_are_read_only_views(self):
+        store = PriceStore(self.store_path)
+        arrays = store.get_arrays('MMM')
+        self.assertEqual(arrays['Date'].dtype, np.int64)
+        self.assertEqual(arrays['Close'].dtype, np.float32)
+        self.assertFalse(arrays['Close'].flags.writeable)
+
+    def test_load_dfs_is_lazy(self):
+        dfs = load_dfs(base_data_path=self.tmp_path, accepted_tickers=np.array(['MMM', 'XOM']))
+        self.assertIsInstance(dfs, LazyPriceDfs)
+        self.assertEqual(list(dfs.keys()), ['MMM', 'XOM'])
+        self.assertEqual(len(dfs.dfs), 0)
+
+        self.assertEqual(len(dfs['XOM']), len(PriceStore(self.store_path).get_arrays('XOM')['Close']))
+        self.assertEqual(list(dfs.dfs.keys()), ['XOM'])
+
+        del dfs['MMM']
+        self.assertEqual(list(dfs.keys()), ['XOM'])
+        self.assertRaises(KeyError, lambda: dfs['AAPL'])
+
+    def test_load_dfs_skips_stale_store(self):
+        # a CSV written after the store, without rebuilding it
+        df = pd.read_csv(self.tmp_path.joinpath('MMM.csv'), header=0, index_col='Date').iloc[:-10]
+        df.to_csv(self.tmp_path.joinpath('MMM.csv'))
+        mtime = self.store_path.stat().st_mtime
+        os.utime(self.tmp_path.joinpath('MMM.csv'), (mtime + 10, mtime + 10))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            dfs = load_dfs(base_data_path=self.tmp_path, accepted_tickers=tickers)
+        self.assertNotIsInstance(dfs, LazyPriceDfs)
+        self.assertEqual(len(dfs['MMM']), len(df))
+
+    def test_save_dfs_rebuilds_store(self):
+        df = PriceStore(self.store_path).get_df('XOM').iloc[:-10]
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_dfs(dfs={'XOM': df}, base_data_path=self.tmp_path)
+            dfs = load_dfs(base_data_path=self.tmp_path, accepted_tickers=tickers)
+        self.assertIsInstance(dfs, LazyPriceDfs)
+        self.assertEqual(len(dfs['XOM']), len(df))
@@ -0,0 +1,52 @@
+import unittest
+import io
+import contextlib
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import runs
+from rl_env import TradingEnv
+from profiling import Profiler
+from testing_utils import load_ticker_df
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = Path(tempfile.mkdtemp())
+        self.episodes = runs.n_train_episodes
+        runs.n_train_episodes = 3
+
+    def tearDown(self):
+        runs.n_train_episodes = self.episodes
+        shutil.rmtree(self.tmp_path)
+
+    def test_train_report(self):
+        step = TradingEnv.step
+        profiler = Profiler(report_path=self.tmp_path.joinpath('report.json'), cprofile_every=2,
+                            track_allocations=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.train(allocations=[-0.5, 0.0, 0.5],
+                       features=['trix', 'rsi'],
+                       model_path=self.tmp_path.joinpath('m.pt'),
+                       dfs={ticker: load_ticker_df(ticker).loc['2017-01-01':] for ticker in ['MMM', 'XOM']},
+                       n_start_point_to_ignore=50,
+                       profiler=profiler)
+
+        # the original methods are back once the run is over
+        self.assertIs(TradingEnv.step, step)
+
+        with open(self.tmp_path.joinpath('report.json')) as f:
+            report = json.load(f)
+        self.assertEqual(report['n_episodes'], 3)
+        self.assertEqual(report['n_steps'], report['phases']['env.step']['n_calls'])
+        self.assertGreater(report['steps_per_second'], 0)
+        phases = report['phases']
+        self.assertEqual(phases['ppo.pi']['n_calls'], report['n_steps'])
+        self.assertEqual(phases['account.trade']['n_calls'], report['n_steps'])
+        self.assertGreater(phases['ppo.train_net']['n_calls'], 0)
+        self.assertLessEqual(phases['env.step']['p50_us'], phases['env.step']['p99_us'])
+        self.assertIsInstance(phases['env.step']['net_allocated_blocks'], int)
+        self.assertEqual(report['cprofile']['n_episodes'], 2)
+        self.assertTrue(any('step' in row['function'] for row in report['cprofile']['functions']))
@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+
+from rl_env import TradingEnv, VecTradingEnv
+from testing_utils import load_ticker_dfs
+
+
+features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+allocations = [-0.5, 0.0, 0.5]
+
+
+class TestVecTradingEnv(unittest.TestCase):
+    def test_matches_single_env(self):
+        dfs = load_ticker_dfs(tickers=['MMM'], n_points=200)
+        env = TradingEnv(dfs=dfs, starting_acc_balance=10000.0, features=features, allocations=allocations,
+                         n_start_point_to_ignore=50)
+        vec_env = VecTradingEnv(dfs=dfs, n_envs=3, starting_acc_balance=10000.0, features=features,
+                                allocations=allocations, n_start_point_to_ignore=50)
+
+        s = env.reset()
+        vec_s = vec_env.reset()
+        self.assertEqual(vec_s.shape, (3, len(features)))
+        np.testing.assert_array_equal(vec_s, np.stack([s] * 3))
+
+        for t in range(20):
+            s, r, done = env.step(t % 3)
+            vec_s, vec_r, vec_done = vec_env.step(np.full(3, t % 3))
+            np.testing.assert_array_equal(vec_s, np.stack([s] * 3))
+            np.testing.assert_array_equal(vec_r, np.full(3, r))
+            self.assertFalse(vec_done.any())
+
+    def test_auto_reset_and_max_episodes(self):
+        dfs = load_ticker_dfs(tickers=['MMM', 'XOM'], n_points=80)
+        vec_env = VecTradingEnv(dfs=dfs, n_envs=2, starting_acc_balance=10000.0, features=features,
+                                allocations=allocations, n_start_point_to_ignore=50, max_episodes=3)
+        vec_env.reset()
+
+        n_done = 0
+        n_steps = 0
+        while vec_env.active.any():
+            active = vec_env.active.copy()
+            _, _, done = vec_env.step(np.ones(2, dtype=int))
+            n_done += (done & active).sum()
+            n_steps += 1
+
+        self.assertEqual(n_done, 3)
+        self.assertEqual(vec_env.n_episodes_started, 3)
+        # each episode runs over the 30 points after the ignored ones
+        self.assertEqual(n_steps, 2 * 29)
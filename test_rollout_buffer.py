@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+import torch
+
+from rollout_buffer import RolloutBuffer
+
+
+def _fill(buffer, rng, n_steps, envs):
+    for _ in range(n_steps):
+        buffer.add(s=rng.normal(size=(len(envs), 5)), a=rng.integers(3, size=len(envs)), r=rng.normal(size=len(envs)),
+                   s_prime=rng.normal(size=(len(envs), 5)), log_prob_a=np.full(len(envs), np.log(1 / 3)),
+                   done=rng.random(size=len(envs)) < 0.1, envs=envs)
+
+
+class TestRolloutBuffer(unittest.TestCase):
+    def test_views(self):
+        rng = np.random.default_rng(0)
+        buffer = RolloutBuffer(capacity=10, dim_state=5, n_envs=3)
+        _fill(buffer, rng, n_steps=4, envs=np.array([0, 2]))
+        _fill(buffer, rng, n_steps=2, envs=np.array([1, 2]))
+        self.assertEqual(list(buffer.n), [4, 2, 6])
+
+        s, a, r, s_prime, done_mask, log_prob_a = buffer.get(2)
+        self.assertEqual(tuple(s.shape), (6, 5))
+        self.assertEqual(tuple(a.shape), (6, 1))
+        self.assertEqual(a.dtype, torch.int64)
+        self.assertEqual(s.data_ptr(), buffer.tensors[0][0, 2].data_ptr())
+        np.testing.assert_array_equal(done_mask.numpy(), buffer.done_mask[:6, 2])
+
+        # written by index: refilling a cleared env overwrites its rows in place
+        buffer.clear(2)
+        _fill(buffer, rng, n_steps=1, envs=np.array([2]))
+        self.assertEqual(s.data_ptr(), buffer.get(2)[0].data_ptr())
+
+        with self.assertRaises(ValueError):
+            buffer.get()
+        with self.assertRaises(IndexError):
+            _fill(buffer, rng, n_steps=7, envs=np.array([0]))
+
+    def test_grow(self):
+        rng = np.random.default_rng(0)
+        buffer = RolloutBuffer(capacity=4, dim_state=5, n_envs=2, growable=True)
+        _fill(buffer, rng, n_steps=3, envs=np.array([0, 1]))
+        expected = [x.copy() for x in (buffer.s[:3], buffer.a[:3], buffer.done_mask[:3])]
+
+        _fill(buffer, rng, n_steps=6, envs=np.array([0, 1]))
+        self.assertEqual(buffer.capacity, 16)
+        self.assertEqual(list(buffer.n), [9, 9])
+        s, a, _, _, done_mask, _ = buffer.get()
+        self.assertEqual(tuple(s.shape), (9, 2, 5))
+        self.assertEqual(s.data_ptr(), buffer.tensors[0].data_ptr())
+        for x, y in zip(expected, (s, a, done_mask)):
+            np.testing.assert_array_equal(y[:3].numpy(), x)
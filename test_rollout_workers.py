@@ -0,0 +1,115 @@
+import unittest
+import io
+import contextlib
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import torch
+
+import runs
+from metrics_log import MetricsReader
+from ppo import PPO
+from rollout_workers import RolloutWorkers
+from testing_utils import load_ticker_dfs
+
+
+features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+allocations = [-0.6, -0.3, 0.0, 0.3, 0.6]
+env_kwargs = {'starting_acc_balance': 10000.0,
+              'features': features,
+              'allocations': allocations,
+              'n_start_point_to_ignore': 100}
+
+
+class TestRolloutWorkers(unittest.TestCase):
+    def setUp(self):
+        self.dfs = load_ticker_dfs(tickers=['AAPL', 'MMM', 'XOM'], n_points=250)
+        torch.manual_seed(0)
+        self.model = PPO(dim_state=len(features), dim_actions=len(allocations))
+
+    def test_get(self):
+        horizon = 40
+        workers = RolloutWorkers(model=self.model, dfs=self.dfs, n_workers=2, horizon=horizon, env_kwargs=env_kwargs)
+        workers.start()
+        try:
+            n_episodes = {0: 0, 1: 0}
+            for _ in range(20):
+                worker_id, batch, episode = workers.get()
+                s, a, r, s_prime, done_mask, log_prob_a = batch
+                n = len(s)
+                self.assertIn(worker_id, n_episodes)
+                self.assertTrue(0 < n <= horizon)
+                self.assertEqual(s.shape, (n, len(features)))
+                self.assertEqual(s_prime.shape, (n, len(features)))
+                for x in (a, r, done_mask, log_prob_a):
+                    self.assertEqual(x.shape, (n, 1))
+                self.assertEqual(a.dtype, torch.int64)
+                self.assertTrue(((a >= 0) & (a < len(allocations))).all())
+                self.assertTrue((log_prob_a <= 0).all())
+                # chunks are consecutive steps and only the last step of an episode is done
+                torch.testing.assert_close(s[1:], s_prime[:-1])
+                self.assertTrue((done_mask[:-1] == 1).all())
+                self.assertEqual(done_mask[-1].item(), 0.0 if episode is not None else 1.0)
+                if episode is None:
+                    self.assertEqual(n, horizon)
+                else:
+                    mean, std, n_points, seconds = episode
+                    self.assertTrue(np.isfinite(mean) and np.isfinite(std))
+                    self.assertGreater(seconds, 0)
+                    self.assertGreaterEqual(n_points, n)
+                    n_episodes[worker_id] += 1
+                workers.publish(self.model)
+            self.assertTrue(all(n > 0 for n in n_episodes.values()))
+        finally:
+            workers.close()
+        self.assertFalse(any(p.is_alive() for p in workers.processes))
+        self.assertFalse(workers.dataset.path.exists())
+
+    def test_too_many_workers(self):
+        with self.assertRaises(ValueError):
+            RolloutWorkers(model=self.model, dfs=self.dfs, n_workers=4, horizon=10, env_kwargs=env_kwargs)
+
+    def test_worker_failure(self):
+        workers = RolloutWorkers(model=self.model, dfs=self.dfs, n_workers=2, horizon=10, env_kwargs=env_kwargs)
+        workers.start()
+        try:
+            workers.get()
+            workers.processes[1].terminate()
+            workers.processes[1].join()
+            with self.assertRaises(RuntimeError):
+                for _ in range(100):
+                    workers.get()
+        finally:
+            workers.close()
+
+
+class TestTrainWithWorkers(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = Path(tempfile.mkdtemp())
+        self.n_train_episodes = runs.n_train_episodes
+        runs.n_train_episodes = 4
+
+    def tearDown(self):
+        runs.n_train_episodes = self.n_train_episodes
+        shutil.rmtree(self.tmp_path)
+
+    def test_train(self):
+        dfs = load_ticker_dfs(tickers=['AAPL', 'MMM', 'XOM'], n_points=250)
+        model_path = self.tmp_path.joinpath('model.pt')
+        metrics_path = self.tmp_path.joinpath('metrics')
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.train(allocations=allocations, features=features, model_path=model_path, dfs=dfs,
+                       n_start_point_to_ignore=100, n_workers=2, metrics_path=metrics_path)
+
+        model = PPO(dim_state=len(features), dim_actions=len(allocations))
+        model.load_state_dict(torch.load(model_path))
+        reader = MetricsReader(metrics_path)
+        df = reader.read()
+        reader.close()
+        self.assertEqual(df['episode'].tolist(), [1, 2, 3, 4])
+        # every episode spans the rows after n_start_point_to_ignore, minus the final step without a return
+        self.assertTrue((df['steps'] == 149).all())
+        self.assertTrue((df['n_updates'] >= 1).all())
+        self.assertTrue((df['episode_seconds'] > 0).all())
+        self.assertFalse(df[['mean', 'std', 'policy_loss', 'value_loss']].isna().any().any())
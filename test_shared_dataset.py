@@ -0,0 +1,54 @@
+import unittest
+import pickle
+import numpy as np
+
+from feature_store import FeatureStore
+from rl_env import TradingEnv
+from shared_dataset import SharedDataset
+from testing_utils import load_ticker_dfs
+
+
+features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+
+
+class TestSharedDataset(unittest.TestCase):
+    def test_matches_feature_store(self):
+        dfs = load_ticker_dfs(tickers=['MMM', 'XOM'], n_points=150)
+        feature_store = FeatureStore()
+        with SharedDataset.create(dfs=dfs, features=features) as dataset:
+            self.assertEqual(dataset.tickers, ['MMM', 'XOM'])
+            for ticker in dfs.keys():
+                expected = feature_store.get(ticker=ticker, df=dfs[ticker], features=features)
+                for frame in (dataset.get(ticker), pickle.loads(pickle.dumps(dataset)).get(ticker),
+                              SharedDataset.open(dataset.path).get(ticker)):
+                    np.testing.assert_array_equal(frame.dates, expected.dates)
+                    np.testing.assert_array_equal(frame.close, expected.close)
+                    np.testing.assert_array_equal(frame.values, expected.values)
+                    self.assertFalse(frame.values.flags.writeable)
+
+            subset = dataset.subset(['XOM'])
+            self.assertEqual(subset.tickers, ['XOM'])
+            self.assertFalse(subset.owner)
+            self.assertFalse(pickle.loads(pickle.dumps(dataset)).owner)
+        self.assertFalse(dataset.path.exists())
+
+    def test_env_on_dataset(self):
+        dfs = load_ticker_dfs(tickers=['MMM'], n_points=120)
+        env_kwargs = {'starting_acc_balance': 10000.0, 'features': features, 'allocations': [-0.5, 0.0, 0.5],
+                      'n_start_point_to_ignore': 50}
+        env = TradingEnv(dfs=dfs, **env_kwargs)
+        with SharedDataset.create(dfs=dfs, features=features) as dataset:
+            dataset_env = TradingEnv(dfs=None, dataset=dataset, **env_kwargs)
+            np.testing.assert_array_equal(dataset_env.reset(), env.reset())
+            done = False
+            t = 0
+            while not done:
+                s, r, done = env.step(t % 3)
+                dataset_s, dataset_r, dataset_done = dataset_env.step(t % 3)
+                np.testing.assert_array_equal(dataset_s, s)
+                self.assertEqual(dataset_r, r)
+                self.assertEqual(dataset_done, done)
+                t += 1
+
+            with self.assertRaises(ValueError):
+                TradingEnv(dfs=None, dataset=dataset, **dict(env_kwargs, features=['trix']))
@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+
+from features import attach_features, get_state_for_policy, feature_specs
+from streaming_features import StreamingFeatures
+from testing_utils import load_ticker_dfs
+
+
+class TestStreamingFeatures(unittest.TestCase):
+    def test_matches_batch(self):
+        features = list(feature_specs.keys())
+        for ticker in ['MMM', 'XOM', 'MO']:
+            df = load_ticker_dfs(tickers=[ticker], n_points=600)[ticker]
+            batch_df = df.copy()
+            attach_features(df=batch_df, features=features)
+
+            streaming_features = StreamingFeatures(features=features)
+            values = []
+            for date, high, low, close in zip(df.index, df['High'], df['Low'], df['Close']):
+                streaming_features.update(high=high, low=low, close=close, date=date)
+                values.append([streaming_features.values[feature] for feature in features])
+
+            np.testing.assert_allclose(np.array(values), batch_df[features].values, rtol=1e-9, atol=1e-12,
+                                       err_msg=ticker)
+
+    def test_get_state_for_policy(self):
+        features = ['trix', 'rsi', 'cci', 'aroon', 'perc_bb']
+        df = load_ticker_dfs(tickers=['AAPL'], n_points=300)['AAPL']
+        batch_df = df.copy()
+        attach_features(df=batch_df, features=features)
+
+        streaming_features = StreamingFeatures(features=features)
+        state = streaming_features.update_df(df.iloc[:-1])
+        np.testing.assert_allclose(state, get_state_for_policy(df=batch_df, day=df.index[-2], features=features),
+                                   rtol=1e-6)
+
+        last = df.iloc[-1]
+        state = streaming_features.update(high=last['High'], low=last['Low'], close=last['Close'], date=df.index[-1])
+        self.assertEqual(state.dtype, np.float32)
+        np.testing.assert_allclose(streaming_features.get_state_for_policy(day=df.index[-1]), state)
+        np.testing.assert_allclose(state, get_state_for_policy(df=batch_df, day=df.index[-1], features=features),
+                                   rtol=1e-6)
+        with self.assertRaises(ValueError):
+            streaming_features.get_state_for_policy(day=df.index[-2])
@@ -0,0 +1,47 @@
+import unittest
+import io
+import contextlib
+import shutil
+import tempfile
+from pathlib import Path
+import pandas as pd
+
+import runs
+from data_management import walk_forward_folds
+from walk_forward import run_walk_forward, walk_forward_cols
+from testing_utils import load_ticker_df
+
+
+class TestWalkForward(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = Path(tempfile.mkdtemp())
+        self.episodes = runs.n_train_episodes, runs.n_test_episodes
+        runs.n_train_episodes, runs.n_test_episodes = 2, 3
+
+    def tearDown(self):
+        runs.n_train_episodes, runs.n_test_episodes = self.episodes
+        shutil.rmtree(self.tmp_path)
+
+    def test_folds(self):
+        dfs = {ticker: load_ticker_df(ticker).loc['2010-01-01':] for ticker in ['MMM', 'XOM']}
+        folds = walk_forward_folds(first_test_date=pd.Timestamp('2018-01-01'),
+                                   last_test_date=pd.Timestamp('2019-07-01'),
+                                   test_period=pd.DateOffset(months=6),
+                                   train_period=pd.DateOffset(years=2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = run_walk_forward(dfs=dfs, folds=folds, allocations=[-0.5, 0.0, 0.5], features=['trix', 'rsi'],
+                                  models_path=self.tmp_path.joinpath('models'),
+                                  results_path=self.tmp_path.joinpath('walk_forward.csv'),
+                                  baseline_allocation=0.8)
+
+        self.assertEqual(list(df.columns), walk_forward_cols)
+        self.assertEqual(len(df), 3)
+        pd.testing.assert_frame_equal(pd.read_csv(self.tmp_path.joinpath('walk_forward.csv'),
+                                                  parse_dates=['train_start', 'test_start', 'test_end']), df)
+        for i, fold in enumerate(folds):
+            n_test_points = sum(len(ticker_df.loc[fold.test_start:fold.test_end - pd.Timedelta(days=1)])
+                                for ticker_df in dfs.values())
+            self.assertEqual(df.loc[i, 'n_test_tickers'], 2)
+            self.assertEqual(df.loc[i, 'n_test_points'], n_test_points)
+            self.assertTrue(self.tmp_path.joinpath('models', f'fold_{i}.pt').exists())
+        self.assertFalse(df[['mean', 'std', 'baseline_mean', 'baseline_std']].isna().any().any())
@@ -0,0 +1,17 @@
+from pathlib import Path
+import pandas as pd
+
+
+# helpers shared by the test modules
+base_data_path = Path(__file__).parent.joinpath('data')
+
+
+def load_ticker_df(ticker):
+    df = pd.read_csv(base_data_path.joinpath(f'{ticker}.csv'), header=0, index_col='Date')
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+def load_ticker_dfs(tickers, n_points):
+    # the last n_points rows without missing values of every ticker
+    return {ticker: load_ticker_df(ticker).dropna().iloc[-n_points:] for ticker in tickers}
@@ -5,20 +5,28 @@ from bokeh.layouts import column
 import itertools
 from sklearn.metrics import auc
 from bokeh.models import Legend
+from metrics_log import MetricsTail, columns_file_name
 
 
 colors = itertools.cycle(['red', 'green', 'blue'])
 line_dash = itertools.cycle(['solid', 'dotted'])
 
 p3 = Path('.\\selected_training_results')
-files = [x for x in p3.iterdir() if x.is_file()]
+# captured stdout of runs.train (csv files) or metrics logs written by train(..., metrics_path=...) (directories)
+files = [x for x in p3.iterdir() if x.is_file() or x.joinpath(columns_file_name).is_file()]
 dfs = {}
 
 for f in files:
-    df = pd.read_csv(f, header=[0]).reset_index(drop=True)
-    df['mean_ema'] = df['mean'].ewm(span=100, min_periods=10).mean()
-    df['std_ema'] = df['std'].ewm(span=100, min_periods=10).mean()
-    df['sharpe_ratio_ema'] = df['mean_ema'] / df['std_ema']
+    if f.is_dir():
+        # the EMAs are updated as the log is read, see metrics_log.py to follow a running training
+        tail = MetricsTail(f, span=100, min_periods=10)
+        df = tail.read()
+        tail.close()
+    else:
+        df = pd.read_csv(f, header=[0]).reset_index(drop=True)
+        df['mean_ema'] = df['mean'].ewm(span=100, min_periods=10).mean()
+        df['std_ema'] = df['std'].ewm(span=100, min_periods=10).mean()
+        df['sharpe_ratio_ema'] = df['mean_ema'] / df['std_ema']
     dfs[f.stem] = df
 
 min_max_len = min([len(df) for df in dfs.values()])
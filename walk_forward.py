@@ -0,0 +1,140 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import time
+import numpy as np
+import pandas as pd
+import torch
+
+import runs
+from data_management import fold_split
+from shared_dataset import SharedDataset
+
+
+walk_forward_cols = ['fold', 'train_start', 'test_start', 'test_end', 'n_train_tickers', 'n_train_points',
+                     'n_test_tickers', 'n_test_points', 'mean', 'std', 'baseline_mean', 'baseline_std',
+                     'train_seconds', 'test_seconds']
+
+
+def run_walk_forward(dfs, folds, allocations, features, models_path, results_path, n_start_point_to_ignore_train=0,
+                     n_start_point_to_ignore_test=0, baseline_allocation=None, n_workers=1):
+    """
+    Trains a model on the train window of every Fold (see data_management.walk_forward_folds), tests it on the
+    fold's test window and writes one row per fold (daily % return mean and std, optionally those of the baseline
+    allocation, window sizes and timings) to the CSV file results_path. Models and per fold test returns are saved
+    to models_path and next to results_path.
+
+    Features are computed once over the full history of dfs into a SharedDataset, and every window runs on row
+    ranges of it that start after the indicators' warm-up, so overlapping windows share the cached features. Folds
+    run concurrently in n_workers processes.
+    """
+    print('\n######## walk-forward ########\n')
+    models_path = Path(models_path)
+    results_path = Path(results_path)
+    models_path.mkdir(parents=True, exist_ok=True)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with SharedDataset.create(dfs=dfs, features=features) as dataset:
+        first_valid_rows = _first_valid_rows(dataset)
+        tasks = []
+        for i, fold in enumerate(folds):
+            train_dfs, test_dfs = fold_split(dfs=dfs, fold=fold)
+            train_dataset = dataset.slice(_valid_ranges(ranges=train_dfs.ranges, first_valid_rows=first_valid_rows,
+                                                        n_start_point_to_ignore=n_start_point_to_ignore_train))
+            test_dataset = dataset.slice(_valid_ranges(ranges=test_dfs.ranges, first_valid_rows=first_valid_rows,
+                                                       n_start_point_to_ignore=n_start_point_to_ignore_test))
+            tasks.append({'i': i,
+                          'fold': fold,
+                          'train_dataset': train_dataset,
+                          'test_dataset': test_dataset,
+                          'allocations': allocations,
+                          'features': features,
+                          'model_path': models_path.joinpath(f'fold_{i}.pt'),
+                          'results_path': results_path.with_name(f'{results_path.stem}_fold_{i}.csv'),
+                          'n_start_point_to_ignore_train': n_start_point_to_ignore_train,
+                          'n_start_point_to_ignore_test': n_start_point_to_ignore_test,
+                          'baseline_allocation': baseline_allocation})
+
+        if n_workers <= 1:
+            rows = [_run_fold(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=torch.set_num_threads, initargs=(1,)) as pool:
+                rows = list(pool.map(_run_fold, tasks))
+
+    df = pd.DataFrame(rows, columns=walk_forward_cols)
+    df.to_csv(results_path, index=False)
+    print(f'\nwrote walk-forward results of {len(df)} folds to {results_path}.\n')
+    return df
+
+
+def _run_fold(task):
+    i = task['i']
+    fold = task['fold']
+    train_dataset = task['train_dataset']
+    test_dataset = task['test_dataset']
+    row = {'fold': i,
+           'train_start': fold.train_start,
+           'test_start': fold.test_start,
+           'test_end': fold.test_end,
+           'n_train_tickers': len(train_dataset.tickers),
+           'n_train_points': sum(length for _, length in train_dataset.index.values()),
+           'n_test_tickers': len(test_dataset.tickers),
+           'n_test_points': sum(length for _, length in test_dataset.index.values())}
+    if row['n_train_tickers'] == 0 or row['n_test_tickers'] == 0:
+        print(f'-- skipping fold {i}: no tickers with enough data.')
+        return row
+
+    np.random.seed(i)
+    torch.manual_seed(i)
+
+    start = time.perf_counter()
+    runs.train(allocations=task['allocations'],
+               features=task['features'],
+               model_path=task['model_path'],
+               dfs=None,
+               n_start_point_to_ignore=task['n_start_point_to_ignore_train'],
+               dataset=train_dataset)
+    row['train_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    daily_perc_returns = runs.test(allocations=task['allocations'],
+                                   features=task['features'],
+                                   model_path=task['model_path'],
+                                   dfs=None,
+                                   results_path=task['results_path'],
+                                   n_start_point_to_ignore=task['n_start_point_to_ignore_test'],
+                                   seed=i,
+                                   dataset=test_dataset)
+    row['test_seconds'] = time.perf_counter() - start
+    row['mean'] = np.mean(daily_perc_returns)
+    row['std'] = np.std(daily_perc_returns)
+
+    if task['baseline_allocation'] is not None:
+        baseline_results_path = task['results_path'].with_name(f"{task['results_path'].stem}_baseline.csv")
+        daily_perc_returns = runs.test_baseline(allocation=task['baseline_allocation'],
+                                                dfs=None,
+                                                results_path=baseline_results_path,
+                                                n_start_point_to_ignore=task['n_start_point_to_ignore_test'],
+                                                dataset=test_dataset)
+        row['baseline_mean'] = np.mean(daily_perc_returns)
+        row['baseline_std'] = np.std(daily_perc_returns)
+
+    return row
+
+
+def _first_valid_rows(dataset):
+    # ticker -> first row whose features are all finite, i.e. the end of the indicators' warm-up
+    rows = {}
+    for ticker in dataset.tickers:
+        valid = np.isfinite(dataset.get(ticker).values).all(axis=1)
+        rows[ticker] = int(valid.argmax()) if valid.any() else len(valid)
+    return rows
+
+
+def _valid_ranges(ranges, first_valid_rows, n_start_point_to_ignore):
+    # an episode needs at least two rows after the ignored ones
+    valid_ranges = {}
+    for ticker, (start, stop) in ranges.items():
+        start = max(start, first_valid_rows[ticker])
+        if stop - start >= n_start_point_to_ignore + 2:
+            valid_ranges[ticker] = (start, stop)
+    return valid_ranges